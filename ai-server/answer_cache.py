@@ -0,0 +1,146 @@
+import collections
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Size of the hashed bag-of-n-grams vectors used for fuzzy matching
+EMBEDDING_DIM = 512
+
+# Words that don't change what a question asks; every other word and number must match for a fuzzy hit
+STOPWORDS = frozenset("""
+    a an the is are was were be been am do does did can could would should will i me my you your we our
+    it its this that these those of to in on at for with about from by as and or so please s
+""".split())
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def content_tokens(normalized):
+    """The words and numbers of a normalized question, apart from stopwords"""
+    return frozenset(word for word in normalized.split() if word not in STOPWORDS)
+
+
+def embed_question(normalized):
+    """
+    Unit vector of hashed word and character-trigram counts. Questions
+    worded almost the same way (a dropped word, a plural, a typo from STT)
+    have a cosine similarity close to 1.
+    """
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    words = normalized.split()
+    padded = f" {normalized} "
+    features = words + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    for feature in features:
+        vector[zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIM] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """
+    Answers to recent questions, keyed on the normalized question, the
+    fingerprint key of the screen it was asked about (see ScreenCache) and
+    a digest of the conversation history sent with it, so "what's next?"
+    is only answered from the cache after the same earlier turns.
+
+    A lookup first tries an exact match on both. Fuzzy matching is opt-in
+    (set `similarity`): it then looks for the most similar cached question
+    (cosine similarity of at least `similarity`) asked about the same,
+    known screen with exactly the same content words and numbers, so
+    "the value of x" never answers "the value of y". Entries expire after
+    ttl seconds; beyond max_entries the least recently used is evicted.
+    """
+
+    def __init__(self, ttl=600, max_entries=256, similarity=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    def _same_screen(self, a, b):
+        # Without a screenshot every question would share one "screen"
+        return a is not None and a == b
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        self._stats["expired"] += len(expired)
+
+    def lookup(self, question, screen_hash, context=None):
+        """
+        Returns {"answer", "question", "match", "llm_ms"} for a cached answer, or None.
+        `context` identifies the history sent with the question (None for none).
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._stats["lookups"] += 1
+
+            entry = self._entries.get((normalized, screen_hash, context))
+            match = "exact"
+            if entry is None and self.similarity and screen_hash is not None:
+                match = "fuzzy"
+                vector = embed_question(normalized)
+                tokens = content_tokens(normalized)
+                best_similarity = self.similarity
+                for candidate in self._entries.values():
+                    if (not self._same_screen(candidate["screen_hash"], screen_hash)
+                            or candidate["context"] != context or candidate["tokens"] != tokens):
+                        continue
+                    similarity = float(np.dot(vector, candidate["vector"]))
+                    if similarity >= best_similarity:
+                        entry, best_similarity = candidate, similarity
+
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(entry["key"])
+            entry["hits"] += 1
+            self._stats[f"{match}_hits"] += 1
+            self._stats["saved_ms"] += entry["llm_ms"]
+            return {"answer": entry["answer"], "question": entry["question"],
+                    "match": match, "llm_ms": entry["llm_ms"]}
+
+    def store(self, question, screen_hash, answer, llm_ms=0, context=None):
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        key = (normalized, screen_hash, context)
+        entry = {
+            "key": key,
+            "question": question,
+            "screen_hash": screen_hash,
+            "context": context,
+            "answer": answer,
+            "llm_ms": llm_ms,
+            "vector": embed_question(normalized),
+            "tokens": content_tokens(normalized),
+            "created": time.time(),
+            "hits": 0,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        hits = stats.get("exact_hits", 0) + stats.get("fuzzy_hits", 0)
+        lookups = stats.get("lookups", 0)
+        stats["hit_ratio"] = round(hits / lookups, 3) if lookups else None
+        return stats
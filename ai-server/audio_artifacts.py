@@ -0,0 +1,174 @@
+import collections
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from audio_formats import AUDIO_FORMATS, transcode
+
+logger = logging.getLogger('origin_logger')
+
+ARTIFACT_ID = re.compile(r"^[0-9a-f]{6,64}$")
+
+
+class AudioArtifactStore:
+    """
+    One immutable WAV file per spoken response, addressed by response ID,
+    so concurrent answers never overwrite each other and a client can
+    cache or resume a download by URL.
+
+    Artifacts older than `retention` seconds are deleted, except the
+    latest answer, which /get-audio without an ID still serves. Only
+    artifacts published with latest=True become the latest answer, so
+    answers for one client (a streaming session) never show up there.
+    At most max_artifacts are kept either way.
+
+    Compressed copies (see audio_formats) are encoded once per artifact,
+    when first requested or, for the formats in `preencode`, right after
+    publishing, and are deleted along with it.
+    """
+
+    def __init__(self, directory="responses", retention=600, max_artifacts=100, preencode=()):
+        self.directory = os.path.abspath(directory)
+        self.retention = retention
+        self.max_artifacts = max_artifacts
+        self.preencode = tuple(preencode)
+        self._artifacts = collections.OrderedDict()  # response_id -> artifact, oldest first
+        self._latest = None  # response_id served by /get-audio
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "expired": 0, "transcodes": 0, "transcode_errors": 0,
+                       "transcode_ms": 0, "variant_hits": 0, "wav_bytes_encoded": 0, "encoded_bytes": 0}
+        os.makedirs(self.directory, exist_ok=True)
+        # Nothing refers to artifacts from a previous run
+        extensions = tuple(f".{audio_format['extension']}" for audio_format in AUDIO_FORMATS.values()) + (".tmp",)
+        for name in os.listdir(self.directory):
+            if ARTIFACT_ID.match(name.split(".")[0]) and name.endswith(extensions):
+                os.remove(os.path.join(self.directory, name))
+
+    def path(self, response_id):
+        return os.path.join(self.directory, f"{response_id}.wav")
+
+    def publish(self, response_id, wav, latest=True):
+        """
+        Store the `wav` bytes for `response_id`. With latest=False it is
+        only available by ID. Returns the artifact.
+        """
+        if not ARTIFACT_ID.match(response_id):
+            raise ValueError(f"Invalid response id {response_id!r}")
+        path = self.path(response_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(wav)
+            digest = hashlib.sha256(wav).hexdigest()
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        artifact = {
+            "id": response_id,
+            "path": path,
+            "size": os.path.getsize(path),
+            "etag": digest[:32],
+            "created": time.time(),
+            "variants": {},  # format -> encoded copy
+            "encoding": {},  # format -> lock held while it is encoded
+        }
+        with self._lock:
+            self._artifacts.pop(response_id, None)
+            self._artifacts[response_id] = artifact
+            if latest:
+                self._latest = response_id
+            self._stats["published"] += 1
+            self._expire(artifact["created"])
+        if self.preencode:
+            threading.Thread(target=self._preencode, args=(response_id,), daemon=True).start()
+        return artifact
+
+    def _preencode(self, response_id):
+        for name in self.preencode:
+            try:
+                self.variant(response_id, name)
+            except Exception as e:
+                logger.warning(f"Audio Artifacts: could not encode {response_id} as {name}: {e}")
+
+    def _expire(self, now):
+        for response_id, oldest in list(self._artifacts.items()):
+            if len(self._artifacts) <= self.max_artifacts and now - oldest["created"] <= self.retention:
+                break
+            if response_id == self._latest:
+                continue  # Still served by /get-audio
+            del self._artifacts[response_id]
+            self._stats["expired"] += 1
+            for path in [oldest["path"]] + [variant["path"] for variant in oldest["variants"].values()]:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Audio Artifacts: could not remove {path}: {e}")
+
+    def get(self, response_id):
+        """The artifact for `response_id`, or None if unknown or expired"""
+        with self._lock:
+            self._expire(time.time())
+            return self._artifacts.get(response_id)
+
+    def variant(self, response_id, name):
+        """
+        The artifact's audio in format `name` as {"path", "size", "etag",
+        "mime"}, encoded from the WAV the first time it is asked for.
+        None if the artifact is unknown or expired. Raises if encoding fails.
+        """
+        with self._lock:
+            artifact = self._artifacts.get(response_id)
+            if artifact is None:
+                return None
+            if name == "wav":
+                return {"path": artifact["path"], "size": artifact["size"], "etag": artifact["etag"],
+                        "mime": AUDIO_FORMATS["wav"]["mime"]}
+            encoding = artifact["encoding"].setdefault(name, threading.Lock())
+
+        # Concurrent requests for the same format wait for one encode instead of each running their own
+        with encoding:
+            variant = artifact["variants"].get(name)
+            if variant is not None:
+                with self._lock:
+                    self._stats["variant_hits"] += 1
+                return variant
+
+            path = os.path.join(self.directory, f"{response_id}.{AUDIO_FORMATS[name]['extension']}")
+            started = time.time()
+            try:
+                transcode(artifact["path"], path, name)
+            except Exception:
+                with self._lock:
+                    self._stats["transcode_errors"] += 1
+                raise
+            variant = {"path": path, "size": os.path.getsize(path), "etag": f"{artifact['etag']}-{name}",
+                       "mime": AUDIO_FORMATS[name]["mime"]}
+            with self._lock:
+                self._stats["transcodes"] += 1
+                self._stats["transcode_ms"] += round((time.time() - started) * 1000)
+                self._stats["wav_bytes_encoded"] += artifact["size"]
+                self._stats["encoded_bytes"] += variant["size"]
+                if self._artifacts.get(response_id) is not artifact:
+                    os.remove(path)  # Expired while it was being encoded
+                    return None
+                artifact["variants"][name] = variant
+            return variant
+
+    def latest(self):
+        with self._lock:
+            return self._artifacts.get(self._latest)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, artifacts=len(self._artifacts),
+                        avg_transcode_ms=round(self._stats["transcode_ms"] / self._stats["transcodes"]) if self._stats["transcodes"] else None,
+                        compression_ratio=round(self._stats["encoded_bytes"] / self._stats["wav_bytes_encoded"], 3) if self._stats["wav_bytes_encoded"] else None,
+                        bytes=sum(artifact["size"] for artifact in self._artifacts.values()),
+                        retention_s=self.retention)
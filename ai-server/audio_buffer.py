@@ -0,0 +1,214 @@
+import collections
+import logging
+import os
+import time
+import wave
+from io import BytesIO
+
+# Shared with voice.py/main.py so debug saves land in the origin log
+logger = logging.getLogger('origin_logger')
+
+
+class UtteranceBuffer:
+    """
+    PCM accumulator for a single utterance.
+
+    Frames are appended to a bytearray that grows with the utterance (with
+    amortized over-allocation, so a 30 ms chunk rarely re-copies what was
+    already captured) up to the longest allowed utterance. Nothing is
+    allocated until speech starts, so an idle endpointer costs only its
+    pre-roll. A small ring of the most recent non-speech frames is kept as
+    pre-roll and prepended when speech starts, so the first syllable is not
+    clipped by the VAD reaction time.
+    """
+
+    def __init__(self, frame_bytes, frame_duration_ms=30, max_duration_ms=30000, pre_roll_ms=150):
+        self.frame_bytes = frame_bytes
+        self.frame_duration_ms = frame_duration_ms
+        self.max_frames = max(1, max_duration_ms // frame_duration_ms)
+        self.capacity = self.max_frames * frame_bytes
+        self._pre_roll = collections.deque(maxlen=max(0, pre_roll_ms // frame_duration_ms))
+        self._data = bytearray()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def active(self):
+        """True once speech has started and audio is being accumulated"""
+        return len(self._data) > 0
+
+    @property
+    def full(self):
+        """True when no further frame fits and the utterance should be flushed"""
+        return len(self._data) + self.frame_bytes > self.capacity
+
+    @property
+    def duration_ms(self):
+        return (len(self._data) // self.frame_bytes) * self.frame_duration_ms
+
+    def push_pre_roll(self, chunk):
+        """Remember a non-speech frame in case speech starts on the next one"""
+        if self._pre_roll.maxlen:
+            self._pre_roll.append(bytes(chunk))
+
+    def append(self, chunk):
+        """
+        Append a frame to the utterance, flushing the pre-roll first if this
+        is the start of speech. Returns False if the buffer is full.
+        """
+        if not self._data:
+            while self._pre_roll:
+                self._write(self._pre_roll.popleft())
+        return self._write(chunk)
+
+    def _write(self, chunk):
+        if len(self._data) + len(chunk) > self.capacity:
+            return False
+        self._data += chunk
+        return True
+
+    def view(self):
+        """Zero-copy view of the accumulated PCM"""
+        return memoryview(self._data)
+
+    def take(self):
+        """
+        Hand the accumulated PCM to the caller as a zero-copy view and start
+        a fresh utterance. The backing storage, sized to the utterance
+        (plus at most about an eighth of growth headroom), is handed off
+        with the view, so the caller may keep it while capture continues.
+        """
+        pcm = memoryview(self._data)
+        self._data = bytearray()
+        return pcm
+
+    def clear(self):
+        self._data = bytearray()
+        self._pre_roll.clear()
+
+
+def write_wav(target, pcm, rate=16000, sample_width=2, channels=1):
+    """
+    Wrap raw PCM in a WAV header and write it to a path or file-like object.
+    Accepts any bytes-like object, including memoryviews from UtteranceBuffer.
+    """
+    with wave.open(target, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(pcm)
+
+
+def join_wavs(wavs):
+    """
+    Concatenate WAV files that share one format into a single WAV: the
+    first file's header is kept and its sizes are patched to cover the
+    audio data of all of them.
+    """
+    wavs = [bytes(wav) for wav in wavs if wav]
+    if not wavs:
+        return b""
+    if len(wavs) == 1:
+        return wavs[0]
+
+    first_data = wavs[0].find(b"data")
+    parts = [wavs[0]]
+    for wav in wavs[1:]:
+        data_pos = wav.find(b"data")
+        if data_pos != -1:
+            parts.append(wav[data_pos + 8:])
+    joined = bytearray(b"".join(parts))
+    joined[4:8] = (len(joined) - 8).to_bytes(4, "little")
+    joined[first_data + 4:first_data + 8] = (len(joined) - first_data - 8).to_bytes(4, "little")
+    return bytes(joined)
+
+
+# RIFF and data chunk size for a WAV whose length isn't known yet; players read until the stream ends
+STREAMING_WAV_SIZE = 0xFFFFFFFF
+
+
+def split_wav(wav):
+    """
+    (header, frames): everything up to and including the data chunk
+    header, and the audio data after it
+    """
+    data_pos = wav.find(b"data")
+    if data_pos == -1:
+        raise ValueError("Not a WAV file: no data chunk")
+    return wav[:data_pos + 8], wav[data_pos + 8:]
+
+
+def streaming_wav_header(header):
+    """
+    The header of a WAV (as returned by split_wav) rewritten for a stream
+    of unknown length, so audio can be sent before all of it exists
+    """
+    header = bytearray(header)
+    header[4:8] = STREAMING_WAV_SIZE.to_bytes(4, "little")
+    header[-4:] = STREAMING_WAV_SIZE.to_bytes(4, "little")
+    return bytes(header)
+
+
+def wav_buffer(pcm, rate=16000, sample_width=2, channels=1, name="audio.wav"):
+    """
+    Encode PCM as an in-memory WAV file that can be handed straight to an
+    STT client in place of an open file.
+    """
+    buffer = BytesIO()
+    write_wav(buffer, pcm, rate=rate, sample_width=sample_width, channels=channels)
+    buffer.seek(0)
+    buffer.name = name  # Upload clients use this as the multipart filename
+    return buffer
+
+
+def audio_label(audio):
+    """
+    Describe an utterance for logging, whether it is a path or an in-memory WAV
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        return f"audio file {audio}"
+    return f"in-memory audio ({audio.getbuffer().nbytes} bytes)"
+
+
+def transcribe_with(audio, transcribe):
+    """
+    Call an STT client with a readable WAV file, opening paths as needed and
+    rewinding in-memory buffers so several providers can read the same audio
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        with open(audio, "rb") as audio_file:
+            return transcribe(audio_file)
+    audio.seek(0)
+    return transcribe(audio)
+
+
+def save_debug_audio(audio, directory="debug_audio"):
+    """
+    Persist an in-memory utterance under a unique name for debugging.
+    Returns the written path, or None if nothing was saved.
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"utterance_{time.time_ns()}.wav")
+        with open(path, "wb") as debug_file:
+            debug_file.write(audio.getbuffer())
+        logger.info(f"Debug: Saved {audio_label(audio)} to {path}")
+        return path
+    except Exception as e:
+        logger.error(f"Debug: Failed to save audio: {e}")
+        return None
+
+
+def clone_audio(audio):
+    """
+    Give a caller its own readable copy of an utterance so several STT
+    providers can read it at the same time. Paths are returned unchanged.
+    """
+    if isinstance(audio, (str, os.PathLike)):
+        return audio
+    clone = BytesIO(audio.getvalue())
+    clone.name = getattr(audio, "name", "audio.wav")
+    return clone
@@ -0,0 +1,51 @@
+import time
+
+from endpointing import Endpointer, EnergyGate
+
+# Constants for audio capturing
+CHANNELS = 1
+RATE = 16000
+CHUNK_DURATION_MS = 30  # milliseconds
+CHUNK_SIZE = int(RATE * CHUNK_DURATION_MS / 1000)  # samples per chunk
+SILENCE_THRESHOLD = 50  # RMS below which a frame counts as silence without asking the VAD; adjust to your environment
+TARGET_DURATION_MS = 700  # Form Sentence after this much silence
+MIC_READ_FRAMES = 8  # Frames read from the mic at once so the energy gate can batch them
+MAX_UTTERANCE_MS = 30000  # Force a sentence break after this much speech
+PRE_ROLL_MS = 150  # Audio kept from before the VAD fires so first syllables aren't clipped
+
+
+#webrtc VAD - every audio source gets its own endpointer
+def create_endpointer():
+    return Endpointer(
+        rate=RATE,
+        frame_duration_ms=CHUNK_DURATION_MS,
+        silence_ms=TARGET_DURATION_MS,
+        max_utterance_ms=MAX_UTTERANCE_MS,
+        pre_roll_ms=PRE_ROLL_MS,
+        vad_mode=3,  # Aggressive mode for better voice detection
+        energy_gate=EnergyGate(silence_rms=SILENCE_THRESHOLD)  # Skip the VAD for obviously silent frames
+    )
+
+
+def run_capture_loop(source, endpointer, on_utterance, should_listen=None):
+    """
+    Read audio from a source (microphone or replayed recording), endpoint it
+    and hand each finished utterance to on_utterance. Returns when the source
+    runs dry; the utterance in progress at that point is flushed too.
+    """
+    while True:
+        if should_listen is not None and not should_listen():
+            time.sleep(0.1)
+            continue
+
+        chunk = source.read(CHUNK_SIZE * MIC_READ_FRAMES)
+        if not chunk:
+            break
+
+        for pcm in endpointer.feed(chunk):
+            # Hand the utterance over and go straight back to the source
+            on_utterance(pcm)
+
+    pcm = endpointer.flush()
+    if pcm is not None:
+        on_utterance(pcm)
@@ -0,0 +1,73 @@
+import os
+import shutil
+import subprocess
+import uuid
+
+# Compressed formats need ffmpeg on the PATH; without it only WAV is served
+FFMPEG = shutil.which("ffmpeg")
+
+# Delivery formats for spoken answers. Speech stays clear at these low bitrates.
+AUDIO_FORMATS = {
+    "wav": {
+        "mime": "audio/wav",
+        "extension": "wav",
+        "accept": ("audio/wav", "audio/wave", "audio/x-wav", "audio/vnd.wave"),
+        "codec_args": None,
+    },
+    "opus": {
+        "mime": "audio/ogg; codecs=opus",
+        "extension": "ogg",
+        "accept": ("audio/ogg", "audio/opus", "application/ogg"),
+        "codec_args": ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"],
+    },
+    "mp3": {
+        "mime": "audio/mpeg",
+        "extension": "mp3",
+        "accept": ("audio/mpeg", "audio/mp3"),
+        "codec_args": ["-c:a", "libmp3lame", "-b:a", "48k"],
+    },
+}
+
+
+def available_formats(enabled):
+    """The formats in `enabled` that can actually be produced here; WAV always is"""
+    formats = ["wav"]
+    for name in enabled:
+        if name in AUDIO_FORMATS and name != "wav" and FFMPEG:
+            formats.append(name)
+    return formats
+
+
+def negotiate_format(accept, available, requested=None, default="wav"):
+    """
+    Pick the format to send: an explicit ?format= if it is available,
+    otherwise the client's most preferred explicitly listed type (werkzeug
+    MIMEAccept, best first). Wildcards like */* get `default`, since a
+    client that names no audio type may not play every codec.
+    """
+    if requested in available:
+        return requested
+    for value, quality in accept:
+        if quality <= 0:
+            continue
+        mime = value.split(";")[0].strip().lower()
+        for name in available:
+            if mime in AUDIO_FORMATS[name]["accept"]:
+                return name
+    return default if default in available else "wav"
+
+
+def transcode(source_path, target_path, name, timeout=30):
+    """
+    Encode a WAV file into format `name` with ffmpeg, writing to a
+    temporary file that is renamed into place once complete
+    """
+    tmp_path = f"{target_path}.{uuid.uuid4().hex[:8]}.tmp"
+    command = [FFMPEG, "-nostdin", "-loglevel", "error", "-y", "-i", source_path,
+               *AUDIO_FORMATS[name]["codec_args"], "-f", AUDIO_FORMATS[name]["extension"], tmp_path]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=timeout)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
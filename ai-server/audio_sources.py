@@ -0,0 +1,85 @@
+import time
+import wave
+
+import numpy as np
+
+
+class MicrophoneSource:
+    """
+    Live microphone input through PyAudio. PyAudio is imported lazily so
+    that replaying recordings works on machines without PortAudio.
+    """
+
+    def __init__(self, rate=16000, channels=1, frames_per_buffer=480):
+        import pyaudio
+
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(format=pyaudio.paInt16, channels=channels, rate=rate,
+                                        input=True, frames_per_buffer=frames_per_buffer)
+        self.rate = rate
+
+    def read(self, n_samples):
+        return self._stream.read(n_samples, exception_on_overflow=False)
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+
+class WavReplaySource:
+    """
+    Replays a recorded WAV file as if it were the microphone.
+
+    `speed` paces reads against the wall clock: 1.0 is real time, 4.0 is
+    four times faster, and 0 returns audio as fast as it is read. Stereo
+    recordings are downmixed; the sample rate must match the capture rate.
+    read() returns b"" once the recording is exhausted.
+    """
+
+    def __init__(self, path, rate=16000, speed=1.0):
+        with wave.open(path, "rb") as wav_file:
+            if wav_file.getframerate() != rate:
+                raise ValueError(f"{path}: expected {rate} Hz audio, got {wav_file.getframerate()} Hz")
+            if wav_file.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit audio, got {wav_file.getsampwidth() * 8}-bit")
+            channels = wav_file.getnchannels()
+            frames = wav_file.readframes(wav_file.getnframes())
+
+        if channels > 1:
+            samples = np.frombuffer(frames, dtype='<i2').reshape(-1, channels)
+            frames = samples.mean(axis=1).astype('<i2').tobytes()
+
+        self.path = path
+        self.rate = rate
+        self.speed = speed
+        self._pcm = memoryview(frames)
+        self._length = len(frames)
+        self._offset = 0
+        self._started = None
+
+    @property
+    def position_ms(self):
+        """How far into the recording the source has been read"""
+        return self._offset / 2 / self.rate * 1000
+
+    @property
+    def duration_ms(self):
+        return self._length / 2 / self.rate * 1000
+
+    def read(self, n_samples):
+        if self._started is None:
+            self._started = time.monotonic()
+        chunk = self._pcm[self._offset:self._offset + n_samples * 2]
+        self._offset += len(chunk)
+
+        if self.speed and chunk:
+            # Block until this audio would have been captured live
+            due = self._started + self._offset / 2 / self.rate / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return bytes(chunk)
+
+    def close(self):
+        self._pcm.release()
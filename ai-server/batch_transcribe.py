@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Batch transcription of recorded audio.
+
+transcribe_batch() fans many recordings out over a bounded thread pool,
+with a separate concurrency cap for each STT provider, and yields one
+result per recording as soon as it is done. voice.py exposes it as
+POST /batch-transcribe. It can also be run directly:
+
+    python batch_transcribe.py recordings/2024-06-01/ --output transcripts.jsonl
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+
+from circuit_breaker import CircuitOpenError
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".ogg", ".webm", ".flac")
+
+
+def iter_audio_files(sources):
+    """
+    Expand paths and directories into recordings. Directories are scanned
+    recursively for AUDIO_EXTENSIONS; (name, buffer) pairs pass through.
+    """
+    for source in sources:
+        if isinstance(source, tuple):
+            yield source
+        elif os.path.isdir(source):
+            for root, _, files in sorted(os.walk(source)):
+                for filename in sorted(files):
+                    if filename.lower().endswith(AUDIO_EXTENSIONS):
+                        path = os.path.join(root, filename)
+                        yield path, path
+        else:
+            yield source, source
+
+
+class LimitedProvider:
+    """An STT provider with a cap on how many calls it may serve at once"""
+
+    def __init__(self, name, transcribe, max_concurrency):
+        self.name = name
+        self.transcribe = transcribe
+        self.slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+
+def transcribe_one(name, audio, providers):
+    """Try each provider in order, within its concurrency limit"""
+    started = time.time()
+    errors = []
+    for provider in providers:
+        try:
+            with provider.slots:
+                text = provider.transcribe(audio)
+        except CircuitOpenError:
+            errors.append(f"{provider.name}: circuit open")
+            continue
+        except Exception as e:
+            errors.append(f"{provider.name}: {e}")
+            continue
+        if text and str(text).strip():
+            return {"file": name, "text": str(text).strip(), "provider": provider.name,
+                    "latency_ms": round((time.time() - started) * 1000)}
+        errors.append(f"{provider.name}: empty transcription")
+    return {"file": name, "text": None, "provider": None,
+            "latency_ms": round((time.time() - started) * 1000), "error": "; ".join(errors)}
+
+
+def transcribe_batch(sources, providers, max_workers=8):
+    """
+    Transcribe many recordings, yielding a result dict per recording in
+    completion order. `providers` is a list of LimitedProvider in
+    preference order. At most 2 * max_workers recordings are queued at once.
+    """
+    pending = iter_audio_files(sources)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-stt") as executor:
+        in_flight = set()
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_workers * 2:
+                item = next(pending, None)
+                if item is None:
+                    exhausted = True
+                    break
+                name, audio = item
+                in_flight.add(executor.submit(transcribe_one, name, audio, providers))
+            if not in_flight:
+                break
+            done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe many recordings with Sarvam and Groq")
+    parser.add_argument("sources", nargs="+", help="Audio files or directories")
+    parser.add_argument("--output", help="Write JSONL here instead of stdout")
+    args = parser.parse_args()
+
+    import voice
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        count = 0
+        for result in transcribe_batch(args.sources, voice.batch_providers, max_workers=voice.BATCH_WORKERS):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            count += 1
+        print(f"Transcribed {count} recordings", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
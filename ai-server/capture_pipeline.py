@@ -0,0 +1,187 @@
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger('origin_logger')
+
+# What to do with a new utterance when the queue is already full
+QUEUE_POLICIES = ("merge", "drop_oldest", "drop_newest", "block")
+
+
+class UtterancePipeline:
+    """
+    Bounded hand-off between the microphone capture loop and the workers that
+    run STT, the LLM and TTS.
+
+    The capture thread only calls submit(), which never waits on processing
+    (except under the "block" policy), so the microphone keeps being read
+    while earlier questions are answered. When the queue is full the policy
+    decides what happens to the new utterance:
+
+    - merge: append it to the newest pending utterance from the same source
+      (key) so no speech is lost; dropped if that source has nothing pending
+    - drop_oldest: discard the oldest pending utterance
+    - drop_newest: discard the new utterance
+    - block: wait for a free slot (up to block_timeout), then drop it
+
+    Utterances from the same source (key) are handled one at a time and in
+    order, however many workers there are: a worker passes over a source
+    whose previous utterance is still being answered and takes the next
+    source's instead.
+    """
+
+    def __init__(self, handler, workers=1, max_pending=4, policy="merge", block_timeout=5.0, name="utterance"):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {QUEUE_POLICIES}")
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._threads = []
+        self._running = False
+        self._busy_keys = set()  # Sources with an utterance being handled right now
+
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "merged": 0,
+            "max_depth": 0,
+            "total_wait_ms": 0.0,
+        }
+        self._in_flight = 0
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return self
+            self._running = True
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Stop accepting work and let workers finish what is already queued"""
+        with self._lock:
+            self._running = False
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, pcm, key=None, context=None):
+        """
+        Queue a finished utterance for processing. `key` identifies the audio
+        source (e.g. a browser session) and is passed to the handler as a
+        second argument when set. `context` travels with this utterance (e.g.
+        the screenshot started when it was endpointed) and is passed to the
+        handler as context= when set; a merged utterance keeps the newest.
+        Returns False if the utterance (or an older one) was dropped to make
+        room.
+        """
+        with self._lock:
+            self._stats["submitted"] += 1
+            accepted = True
+
+            if len(self._pending) >= self.max_pending:
+                if self.policy == "merge":
+                    for index in range(len(self._pending) - 1, -1, -1):
+                        enqueued_at, pending_key, previous, previous_context = self._pending[index]
+                        if pending_key == key:
+                            merged_context = previous_context if context is None else context
+                            self._pending[index] = (enqueued_at, key, bytes(previous) + bytes(pcm), merged_context)
+                            self._stats["merged"] += 1
+                            return True
+                if self.policy in ("merge", "drop_newest"):
+                    self._stats["dropped"] += 1
+                    logger.warning(f"Pipeline {self.name}: queue full, dropped new utterance")
+                    return False
+                if self.policy == "drop_oldest":
+                    self._pending.popleft()
+                    self._stats["dropped"] += 1
+                    accepted = False
+                    logger.warning(f"Pipeline {self.name}: queue full, dropped oldest utterance")
+                elif not self._not_full.wait_for(lambda: len(self._pending) < self.max_pending or not self._running,
+                                                 timeout=self.block_timeout):
+                    self._stats["dropped"] += 1
+                    logger.warning(f"Pipeline {self.name}: queue full for {self.block_timeout}s, dropped new utterance")
+                    return False
+
+            self._pending.append((time.monotonic(), key, pcm, context))
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._pending))
+            self._not_empty.notify()
+            return accepted
+
+    def _next_ready(self):
+        """Index of the oldest pending utterance whose source isn't busy, or None"""
+        for index, (_, key, _, _) in enumerate(self._pending):
+            if key is None or key not in self._busy_keys:
+                return index
+        return None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._not_empty.wait_for(lambda: self._next_ready() is not None or not self._running)
+                index = self._next_ready()
+                if index is None:
+                    return  # Stopping; whatever is left belongs to sources a busy worker will finish
+                enqueued_at, key, pcm, context = self._pending[index]
+                del self._pending[index]
+                if key is not None:
+                    self._busy_keys.add(key)
+                self._stats["total_wait_ms"] += (time.monotonic() - enqueued_at) * 1000
+                self._in_flight += 1
+                self._not_full.notify()
+
+            try:
+                args = (pcm,) if key is None else (pcm, key)
+                if context is None:
+                    self.handler(*args)
+                else:
+                    self.handler(*args, context=context)
+                outcome = "processed"
+            except Exception as e:
+                outcome = "failed"
+                logger.error(f"Pipeline {self.name}: handler failed: {e}")
+
+            with self._lock:
+                self._stats[outcome] += 1
+                self._in_flight -= 1
+                if key is not None:
+                    self._busy_keys.discard(key)
+                    self._not_empty.notify_all()  # Its next utterance can go to any worker now
+
+    def metrics(self):
+        """Snapshot of queue depth and throughput counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            depth = len(self._pending)
+            in_flight = self._in_flight
+        dequeued = stats["processed"] + stats["failed"] + in_flight
+        return {
+            "policy": self.policy,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "depth": depth,
+            "in_flight": in_flight,
+            "max_depth": stats["max_depth"],
+            "submitted": stats["submitted"],
+            "processed": stats["processed"],
+            "failed": stats["failed"],
+            "dropped": stats["dropped"],
+            "merged": stats["merged"],
+            "avg_wait_ms": round(stats["total_wait_ms"] / dequeued, 1) if dequeued else 0.0,
+        }
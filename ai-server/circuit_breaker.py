@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+from rate_limiter import retry_after_seconds
+
+logger = logging.getLogger('origin_logger')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one external provider.
+
+    closed: calls go through. After failure_threshold consecutive failures
+        or slow calls (slower than slow_call_ms) the breaker opens.
+    open: calls are skipped with CircuitOpenError until reset_timeout
+        seconds have passed.
+    half_open: a single probe call is let through; success closes the
+        breaker, failure opens it again.
+
+    A rate-limited (429) call says the provider is busy, not unhealthy: it
+    is neither a success nor a failure, so throttling never opens the breaker.
+    """
+
+    def __init__(self, name, failure_threshold=3, slow_call_ms=8000, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_ms = slow_call_ms
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "failures": 0, "slow_calls": 0, "skipped": 0, "opened": 0, "throttled": 0}
+
+    def allow(self):
+        """Whether a call may go to the provider right now"""
+        with self._lock:
+            if self.state == "open" and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self._stats["skipped"] += 1
+            return False
+
+    def record(self, success, latency_ms, error=None):
+        with self._lock:
+            self._stats["calls"] += 1
+            slow = latency_ms > self.slow_call_ms
+            if slow:
+                self._stats["slow_calls"] += 1
+            if not success:
+                self._stats["failures"] += 1
+                self.last_error = error
+
+            if success and not slow:
+                self.consecutive_failures = 0
+                if self.state != "closed":
+                    logger.info(f"Breaker {self.name}: probe succeeded, closing")
+                self.state = "closed"
+                self._probing = False
+                return
+
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self._stats["opened"] += 1
+                    logger.warning(f"Breaker {self.name}: opening after {self.consecutive_failures} "
+                                   f"failed or slow calls ({error or ('slow' if slow else 'failed')})")
+                self.state = "open"
+                self.opened_at = time.time()
+                self._probing = False
+
+    def release(self):
+        """Record a call that proved nothing either way, freeing the half-open probe"""
+        with self._lock:
+            self._stats["throttled"] += 1
+            self._probing = False
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run fn through the breaker. A falsy result counts as a failure, since
+        the provider helpers return None/False rather than raising.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        started = time.time()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if retry_after_seconds(e) is not None:
+                self.release()
+            else:
+                self.record(False, (time.time() - started) * 1000, error=str(e))
+            raise
+        self.record(bool(result), (time.time() - started) * 1000, error=None if result else "empty result")
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = round(max(0, self.reset_timeout - (time.time() - self.opened_at)), 1)
+            return dict(
+                self._stats,
+                state=self.state,
+                consecutive_failures=self.consecutive_failures,
+                retry_in_seconds=retry_in,
+                last_error=self.last_error
+            )
@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+from screen_capture import estimate_text_tokens
+
+
+def conversation_turns(conversation):
+    """Pair up a flat list of user/ai messages into (question, answer) turns"""
+    turns = []
+    question = None
+    for message in conversation:
+        if message["type"] == "user":
+            question = message["text"]
+        elif message["type"] == "ai" and question is not None:
+            turns.append((question, message["text"]))
+            question = None
+    return turns
+
+
+def build_history(conversation, budget_tokens=1200, summary_tokens=150):
+    """
+    Chat messages carrying earlier turns of the conversation, sized to fit
+    a token budget.
+
+    The newest turns are kept word for word while they fit in
+    budget_tokens. The questions from older turns are folded into a
+    single system note of at most summary_tokens, newest first. Anything
+    beyond that is dropped, so the prompt stays bounded however long the
+    session runs.
+
+    Returns (messages, stats).
+    """
+    turns = conversation_turns(conversation)
+    kept, used = [], 0
+    for question, answer in reversed(turns):
+        cost = estimate_text_tokens(question) + estimate_text_tokens(answer)
+        if used + cost > budget_tokens:
+            break
+        kept.append((question, answer))
+        used += cost
+    kept.reverse()
+
+    older = turns[:len(turns) - len(kept)]
+    summarized = []
+    summary_used = 0
+    for question, _ in reversed(older):
+        cost = estimate_text_tokens(question) + 1
+        if summary_used + cost > summary_tokens:
+            break
+        summarized.append(question)
+        summary_used += cost
+
+    messages = []
+    if summarized:
+        messages.append({
+            "role": "system",
+            "content": "Earlier in this session the student asked: " + "; ".join(reversed(summarized))
+        })
+    for question, answer in kept:
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+
+    stats = {
+        "context_turns": len(kept),
+        "summarized_turns": len(summarized),
+        "dropped_turns": len(older) - len(summarized),
+        "context_tokens": used + summary_used,
+    }
+    return messages, stats
+
+
+def history_digest(messages):
+    """
+    Short digest of the history sent with a question, so a cached answer
+    is only reused for a follow-up asked in the same context. None for an
+    empty history.
+    """
+    if not messages:
+        return None
+    material = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=8).hexdigest()
@@ -0,0 +1,170 @@
+import numpy as np
+import webrtcvad
+
+from audio_buffer import UtteranceBuffer
+
+
+class EnergyGate:
+    """
+    Cheap vectorized pre-classifier for 16-bit PCM frames.
+
+    Frames whose RMS energy is below silence_rms are clearly silent, and
+    quiet frames with a very high zero-crossing rate are hiss rather than
+    voice. Both are classified without calling webrtcvad; everything else
+    is ambiguous and left to the VAD. The zero-crossing rate is only
+    computed for the quiet frames where it can change the outcome.
+
+    NumPy call overhead makes a single frame more expensive to gate than to
+    hand to webrtcvad, so the gate only pays off on batches of frames.
+    """
+
+    def __init__(self, silence_rms=50, noise_rms_factor=2.0, noise_zcr=0.4):
+        self.silence_rms = silence_rms
+        self.noise_rms = silence_rms * noise_rms_factor
+        self.noise_zcr = noise_zcr
+
+    def clearly_silent(self, frames):
+        """
+        Classify a 2-D int16 array of shape (n_frames, samples_per_frame).
+        Returns a boolean array, True where the frame is certainly silent.
+        """
+        samples = frames.astype(np.float32)
+        mean_square = np.einsum('ij,ij->i', samples, samples) / frames.shape[1]
+        silent = mean_square < self.silence_rms ** 2
+
+        quiet = ~silent & (mean_square < self.noise_rms ** 2)
+        if quiet.any():
+            quiet_frames = frames[quiet]
+            # Adjacent samples have opposite signs exactly when their XOR is negative
+            crossings = np.count_nonzero((quiet_frames[:, 1:] ^ quiet_frames[:, :-1]) < 0, axis=1)
+            silent[quiet] = crossings / (frames.shape[1] - 1) > self.noise_zcr
+        return silent
+
+
+class Endpointer:
+    """
+    Turns a stream of 16-bit mono PCM into finished utterances.
+
+    Each Endpointer owns its own webrtcvad instance, utterance buffer and
+    silence counter, so the local microphone and every browser session keep
+    independent endpointing state. Audio may arrive in arbitrary sized
+    pieces; it is re-framed into CHUNK_DURATION_MS frames for the VAD.
+    An optional EnergyGate settles obviously silent frames before the VAD
+    is consulted; it runs on batches of at least gate_min_batch frames
+    buffered by feed(), while single frames go straight to the VAD.
+    """
+
+    def __init__(self, rate=16000, frame_duration_ms=30, silence_ms=700, max_utterance_ms=30000,
+                 pre_roll_ms=150, vad_mode=3, energy_gate=None, gate_min_batch=4):
+        self.rate = rate
+        self.frame_duration_ms = frame_duration_ms
+        self.frame_samples = int(rate * frame_duration_ms / 1000)
+        self.frame_bytes = self.frame_samples * 2  # 16-bit samples
+        self.silence_ms = silence_ms
+        self.energy_gate = energy_gate
+        self.gate_min_batch = gate_min_batch
+        # Frames settled by the energy gate vs. by webrtcvad
+        self.stats = {"gate_silent": 0, "vad_silent": 0, "vad_speech": 0}
+
+        self.vad = webrtcvad.Vad()
+        self.vad.set_mode(vad_mode)
+        self.utterance = UtteranceBuffer(
+            frame_bytes=self.frame_bytes,
+            frame_duration_ms=frame_duration_ms,
+            max_duration_ms=max_utterance_ms,
+            pre_roll_ms=pre_roll_ms
+        )
+        self.accumulated_silence = 0
+        # Positions in audio time (frames fed so far), independent of how fast the audio arrives
+        self.frames_processed = 0
+        self.last_speech_frame = None  # frames_processed at the latest voiced frame
+        # The latest finished utterance: where it ended, and how much audio after the last voiced frame it took to end it
+        self.last_endpoint = None  # {"position_ms", "latency_ms"}
+        self._partial = bytearray()
+
+    @property
+    def in_speech(self):
+        return self.utterance.active
+
+    def gate(self, data, n_frames):
+        """
+        Energy-gate n_frames consecutive frames at once. Returns None when
+        there is no gate or the batch is too small to be worth it.
+        """
+        if self.energy_gate is None or n_frames < self.gate_min_batch:
+            return None
+        frames = np.frombuffer(data, dtype='<i2', count=n_frames * self.frame_samples)
+        return self.energy_gate.clearly_silent(frames.reshape(n_frames, self.frame_samples))
+
+    def is_silence(self, frame, gated_silent=False):
+        if gated_silent:
+            self.stats["gate_silent"] += 1
+            return True
+        if self.vad.is_speech(frame, self.rate):
+            self.stats["vad_speech"] += 1
+            return False
+        self.stats["vad_silent"] += 1
+        return True
+
+    def process_frame(self, frame, gated_silent=False):
+        """
+        Feed exactly one frame. Returns the PCM of a finished utterance when
+        this frame ends one, otherwise None. `gated_silent` carries a
+        pre-computed energy gate decision from a batch.
+        """
+        is_silent = self.is_silence(frame, gated_silent)
+        self.frames_processed += 1
+
+        if is_silent:
+            if not self.utterance.active:
+                self.utterance.push_pre_roll(frame)
+                return None
+            self.utterance.append(frame)
+            self.accumulated_silence += self.frame_duration_ms
+            end_of_sentence = self.accumulated_silence >= self.silence_ms
+        else:
+            self.utterance.append(frame)
+            self.accumulated_silence = 0
+            self.last_speech_frame = self.frames_processed
+            end_of_sentence = False
+
+        if end_of_sentence or self.utterance.full:
+            self.accumulated_silence = 0
+            self._mark_endpoint()
+            return self.utterance.take()
+        return None
+
+    def _mark_endpoint(self):
+        latency = None
+        if self.last_speech_frame is not None:
+            latency = (self.frames_processed - self.last_speech_frame) * self.frame_duration_ms
+        self.last_endpoint = {"position_ms": self.frames_processed * self.frame_duration_ms, "latency_ms": latency}
+
+    def feed(self, data):
+        """
+        Feed PCM of any length. Returns a list of finished utterances; any
+        trailing partial frame is kept until the next call.
+        """
+        self._partial += data
+        finished = []
+        n_frames = len(self._partial) // self.frame_bytes
+        view = memoryview(self._partial)
+        gated = self.gate(view, n_frames)
+        for index in range(n_frames):
+            offset = index * self.frame_bytes
+            gated_silent = gated is not None and bool(gated[index])
+            utterance = self.process_frame(view[offset:offset + self.frame_bytes], gated_silent)
+            if utterance is not None:
+                finished.append(utterance)
+        view.release()
+        del self._partial[:n_frames * self.frame_bytes]
+        return finished
+
+    def flush(self):
+        """End the stream: return the utterance in progress, if any"""
+        self._partial.clear()
+        self.accumulated_silence = 0
+        if self.utterance.active:
+            self._mark_endpoint()
+            return self.utterance.take()
+        return None
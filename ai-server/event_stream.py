@@ -0,0 +1,102 @@
+import collections
+import itertools
+import json
+import queue
+import threading
+
+
+class EventBroadcaster:
+    """
+    Fans server events out to every connected browser as server-sent
+    events (SSE), so pages learn about new audio or conversation changes
+    the moment they happen instead of polling for them.
+
+    Every event has a scope: None for the desktop assistant, or a
+    streaming session's ID. A subscriber only receives the events of the
+    scope it subscribed to, so one learner's answers are never played on
+    another learner's page.
+
+    Each subscriber gets its own bounded queue. A client too slow to keep
+    up loses its oldest events, never anyone else's. The last `replay`
+    events are kept so a reconnecting EventSource (which sends
+    Last-Event-ID) catches up on what it missed.
+    """
+
+    def __init__(self, max_subscribers=100, queue_size=64, replay=32, heartbeat=15.0):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscribers = {}  # queue -> scope
+        self._recent = collections.deque(maxlen=replay)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "dropped": 0, "rejected": 0, "connections": 0}
+
+    def publish(self, event, data, scope=None):
+        with self._lock:
+            message = (next(self._ids), event, json.dumps(data))
+            self._recent.append((scope, message))
+            self._stats["published"] += 1
+            subscribers = [subscriber for subscriber, wanted in self._subscribers.items() if wanted == scope]
+        for subscriber in subscribers:
+            self._offer(subscriber, message)
+
+    def _offer(self, subscriber, message):
+        while True:
+            try:
+                subscriber.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()  # Drop this client's oldest event
+                    with self._lock:
+                        self._stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    def subscribe(self, last_event_id=None, scope=None):
+        """
+        A queue receiving every event in `scope` from now on, primed with the
+        recent ones after last_event_id. None if there are too many subscribers.
+        """
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self._stats["rejected"] += 1
+                return None
+            self._subscribers[subscriber] = scope
+            self._stats["connections"] += 1
+            missed = [message for wanted, message in self._recent
+                      if wanted == scope and last_event_id is not None and message[0] > last_event_id]
+        for message in missed:
+            self._offer(subscriber, message)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def stream(self, subscriber, initial=()):
+        """
+        SSE text for a subscriber: `initial` (event, data) pairs first, then
+        every published event, with a comment line as a heartbeat so
+        proxies don't close an idle connection. Unsubscribes when the
+        client goes away.
+        """
+        try:
+            yield "retry: 2000\n\n"
+            for event, data in initial:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            while True:
+                try:
+                    event_id, event, data = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._subscribers))
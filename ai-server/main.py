@@ -1,15 +1,22 @@
 # Initialization pyaudio for microphone and Webrtc vad
 
 # pyaudio audio
-import pyaudio
-import webrtcvad
 import numpy as np
 from pydub import AudioSegment
-from io import BytesIO
+from audio_buffer import wav_buffer, audio_label, transcribe_with, save_debug_audio, join_wavs
+from capture_pipeline import UtterancePipeline
+from circuit_breaker import CircuitBreaker
+from provider_clients import ProviderClientRegistry, CapabilityCache, is_capability_error
+from audio_sources import MicrophoneSource
 
 # Image
-import base64
 import pyautogui
+from screen_capture import prepare_image, estimate_text_tokens
+from rate_limiter import TokenBucketLimiter
+from tts_cache import TTSCache, tts_cache_key
+from audio_artifacts import AudioArtifactStore
+from audio_formats import available_formats, negotiate_format
+from speech_stream import SentenceSplitter, split_long
 
 # Environment variables
 import os
@@ -21,7 +28,7 @@ import logging
 import datetime
 
 # Global variables for web audio playback
-latest_audio_path = None
+latest_audio_id = None
 latest_audio_timestamp = 0
 
 # Setup logging
@@ -71,8 +78,10 @@ except Exception as e:
 # For direct Sarvam API access
 import requests
 import threading
+import concurrent.futures
 from sarvamai import SarvamAI
-from sarvamai.play import save
+import base64
+import uuid
 
 # Check if API keys are set
 groq_api_key = os.environ.get("GROQ_API_KEY")
@@ -112,40 +121,95 @@ if not sarvam_api_key:
 from groq import Groq
 import time
 
-# Constants for audio capturing
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 16000
-CHUNK_DURATION_MS = 30  # milliseconds
-CHUNK_SIZE = int(RATE * CHUNK_DURATION_MS / 1000)  # samples per chunk
-SILENCE_THRESHOLD = 50  # adjust this threshold according to your environment
-TARGET_DURATION_MS = 700  # Form Senetence after this much silence
+# Constants for audio capturing, shared with voice.py and the replay benchmark
+from audio_capture import CHANNELS, RATE, CHUNK_SIZE, create_endpointer, run_capture_loop
+
+# Utterances are kept in memory; set DEBUG_SAVE_AUDIO=1 to also write them to disk
+DEBUG_SAVE_AUDIO = os.environ.get("DEBUG_SAVE_AUDIO", "").lower() in ("1", "true", "yes")
+DEBUG_AUDIO_DIR = "debug_audio"
+
+# Captured utterances are queued for a pool of workers so the mic is never starved
+VOICE_WORKERS = int(os.environ.get("VOICE_WORKERS", 1))
+VOICE_QUEUE_SIZE = int(os.environ.get("VOICE_QUEUE_SIZE", 4))
+VOICE_QUEUE_POLICY = os.environ.get("VOICE_QUEUE_POLICY", "merge")  # merge, drop_oldest, drop_newest or block
+
+# Screenshots are downscaled and compressed before being sent to the vision model
+SCREENSHOT_MAX_DIMENSION = int(os.environ.get("SCREENSHOT_MAX_DIMENSION", 1568))  # Longest side in pixels, 0 to keep full size
+SCREENSHOT_FORMAT = os.environ.get("SCREENSHOT_FORMAT", "JPEG")  # JPEG, WEBP or PNG
+SCREENSHOT_QUALITY = int(os.environ.get("SCREENSHOT_QUALITY", 80))
+
+# Sarvam voice; any change here gives different audio, so it is part of the TTS cache key
+TTS_LANGUAGE = "en-IN"
+TTS_MODEL = "bulbul:v2"
+TTS_SPEAKER = "anushka"
+TTS_MAX_CHARS = 500  # Sarvam's limit per request; longer sentences are split
+TTS_CONCURRENCY = int(os.environ.get("TTS_CONCURRENCY", 3))  # Sentences synthesized at once
+
+# Speech already synthesized is kept on disk and replayed instead of calling Sarvam again
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE", "1").lower() in ("1", "true", "yes")
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = int(os.environ.get("TTS_CACHE_MAX_MB", 100))  # Least recently used audio is deleted beyond this
+
+# Each spoken response is kept as its own file, served at /get-audio/<response_id>
+AUDIO_ARTIFACT_DIR = os.environ.get("AUDIO_ARTIFACT_DIR", "responses")
+AUDIO_RETENTION = int(os.environ.get("AUDIO_RETENTION", 600))  # Seconds a response's audio stays downloadable
+
+# Compressed delivery of /get-audio (needs ffmpeg): formats offered, the one sent to clients that
+# don't ask for a specific type, and those encoded as soon as an answer is published
+AUDIO_DELIVERY_FORMATS = [name.strip().lower() for name in os.environ.get("AUDIO_FORMATS", "opus,mp3").split(",") if name.strip()]
+AUDIO_DEFAULT_FORMAT = os.environ.get("AUDIO_DEFAULT_FORMAT", "wav").lower()
+AUDIO_PREENCODE = [name.strip().lower() for name in os.environ.get("AUDIO_PREENCODE", "opus").split(",") if name.strip()]
 
-#webrtc VAD
-def is_silence(chunk):
-    return not vad.is_speech(chunk, RATE)
+# Groq rate limits, per model; 0 tokens per minute means no token limit
+GROQ_LLM_RPM = int(os.environ.get("GROQ_LLM_RPM", 30))
+GROQ_LLM_TPM = int(os.environ.get("GROQ_LLM_TPM", 30000))
+GROQ_STT_RPM = int(os.environ.get("GROQ_STT_RPM", 20))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", 3))  # Retries after a 429, honouring Retry-After
+GROQ_TRANSIENT_RETRIES = int(os.environ.get("GROQ_TRANSIENT_RETRIES", 2))  # Retries after a 5xx, timeout or dropped connection
+MODEL_CAPABILITY_TTL = int(os.environ.get("MODEL_CAPABILITY_TTL", 3600))  # Seconds to remember that the model refused image input
 
-# Initialize PyAudio
-audio = pyaudio.PyAudio()
+# webrtc VAD - every audio source gets its own endpointer
+mic_endpointer = create_endpointer()
 
-# Initialize WebRTC VAD
-vad = webrtcvad.Vad()
-vad.set_mode(3)  # Aggressive mode for better voice detection
+# Provider clients are created once and share one keep-alive connection pool
+provider_clients = ProviderClientRegistry()
+
+# Circuit breakers skip a provider after repeated failures or slow calls, then probe it again
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 3))
+BREAKER_SLOW_CALL_MS = int(os.environ.get("BREAKER_SLOW_CALL_MS", 8000))
+BREAKER_RESET_SECONDS = int(os.environ.get("BREAKER_RESET_SECONDS", 30))
+
+provider_breakers = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        slow_call_ms=BREAKER_SLOW_CALL_MS,
+        reset_timeout=BREAKER_RESET_SECONDS
+    )
+    for name in ("sarvam_stt", "sarvam_tts", "groq_stt")
+}
+
+def sarvam_client():
+    return provider_clients.get("sarvam", lambda http_client: SarvamAI(
+        api_subscription_key=sarvam_api_key,
+        httpx_client=http_client,
+    ))
 
 # Sarvam API functions
-def sarvam_stt(audio_file_path):
+def sarvam_stt(audio):
     """
-    Transcribe audio using Sarvam's Speech-to-Text API via SarvamAI library
+    Transcribe audio using Sarvam's Speech-to-Text API via SarvamAI library.
+    Accepts a WAV file path or an in-memory WAV buffer.
     """
     try:
-        # Initialize SarvamAI client
-        client = SarvamAI(api_subscription_key=sarvam_api_key)
+        # Shared SarvamAI client on the pooled keep-alive connections
+        client = sarvam_client()
         
         # Transcribe audio using SarvamAI library
-        response = client.speech_to_text.translate(
-            file=open(audio_file_path, "rb"),
+        response = provider_breakers["sarvam_stt"].call(transcribe_with, audio, lambda audio_file: client.speech_to_text.translate(
+            file=audio_file,
             model="saaras:v2.5",  
-        )
+        ))
         
         print("Sarvam STT successful")
         # Extract text from response
@@ -159,47 +223,87 @@ def sarvam_stt(audio_file_path):
             
         # Log the transcription and its origin
         input_logger.info(f"Transcription: {text_result}")
-        origin_logger.info(f"STT: Sarvam processed audio file {audio_file_path} to text")
+        origin_logger.info(f"STT: Sarvam processed {audio_label(audio)} to text")
         
         return text_result
     except Exception as e:
         print(f"Sarvam STT error: {e}")
-        origin_logger.error(f"STT Error: Sarvam failed to process {audio_file_path}: {e}")
+        origin_logger.error(f"STT Error: Sarvam failed to process {audio_label(audio)}: {e}")
         return None
 
-def sarvam_tts(text):
+tts_cache = TTSCache(TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024) if TTS_CACHE_ENABLED else None
+delivery_formats = available_formats(AUDIO_DELIVERY_FORMATS)
+audio_artifacts = AudioArtifactStore(AUDIO_ARTIFACT_DIR, retention=AUDIO_RETENTION,
+                                     preencode=[name for name in AUDIO_PREENCODE if name in delivery_formats and name != "wav"])
+
+# Every Sarvam TTS call runs here, so parallel sentences never exceed the provider's concurrency
+tts_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TTS_CONCURRENCY, thread_name_prefix="tts")
+
+def synthesize_piece(text):
     """
-    Convert text to speech using Sarvam's Text-to-Speech API via SarvamAI library
+    WAV bytes for one sentence, from the TTS cache when the same text was
+    spoken before with the same voice
+    """
+    key = tts_cache_key(text, TTS_SPEAKER, TTS_MODEL, TTS_LANGUAGE)
+    cached_path = tts_cache.lookup(key) if tts_cache else None
+    if cached_path:
+        try:
+            with open(cached_path, "rb") as f:
+                wav = f.read()
+            origin_logger.info(f"TTS: served '{text[:60]}' from the TTS cache")
+            return wav
+        except OSError as e:
+            origin_logger.warning(f"TTS Cache: could not read {cached_path}: {e}")
+    
+    # Shared SarvamAI client on the pooled keep-alive connections
+    client = sarvam_client()
+    
+    # Convert text to speech
+    audio = provider_breakers["sarvam_tts"].call(
+        client.text_to_speech.convert,
+        target_language_code=TTS_LANGUAGE,
+        text=text,
+        model=TTS_MODEL,
+        speaker=TTS_SPEAKER
+    )
+    
+    audios = audio.audios if isinstance(audio.audios, list) else [audio.audios]
+    wav = join_wavs(base64.b64decode(chunk) for chunk in audios)
+    if tts_cache:
+        try:
+            tts_cache.store(key, wav)
+        except OSError as e:
+            origin_logger.warning(f"TTS Cache: could not store audio: {e}")
+    return wav
+
+def sarvam_tts(text, response_id):
+    """
+    Convert text to speech using Sarvam's Text-to-Speech API via SarvamAI library.
+    The answer is split at sentences, which are synthesized in parallel and
+    joined in order, so nothing is cut off however long it is.
+    The audio is published as response_id's artifact; returns its path, or
+    False if nothing was synthesized.
     """
     try:
         text = text.strip()
-        if not text or len(text) > 500:  # Limit text length to avoid API errors
-            print("Warning: Empty or too long text passed to TTS.")
-            if text and len(text) > 500:
-                text = text[:500] + "..."  # Truncate text if too long
-            else:
-                return False
+        if not text:
+            print("Warning: Empty text passed to TTS.")
+            return False
         
-        # Initialize SarvamAI client
-        client = SarvamAI(api_subscription_key=sarvam_api_key)
+        splitter = SentenceSplitter()
+        sentences = splitter.feed(text) + [splitter.flush()]
+        pieces = [piece for sentence in sentences if sentence for piece in split_long(sentence, TTS_MAX_CHARS)]
+        wav = join_wavs(tts_executor.map(synthesize_piece, pieces))
         
-        # Convert text to speech
-        audio = client.text_to_speech.convert(
-            target_language_code="en-IN",  
-            text=text,
-            model="bulbul:v2",
-            speaker="anushka"
-        )
-        
-        # Save the audio to a file
-        save(audio, "response.wav")
-        print(f"Sarvam TTS successful - saved audio of type: {type(audio)}")
+        # Save the audio to this response's own file
+        output_path = audio_artifacts.publish(response_id, wav=wav)["path"]
+        print(f"Sarvam TTS successful - saved audio to {output_path}")
         
         # Log the TTS generation
         output_logger.info(f"TTS Output: '{text}' converted to speech")
-        origin_logger.info(f"TTS: Sarvam converted text to speech: '{text}'")
+        origin_logger.info(f"TTS: Sarvam converted text to speech in {len(pieces)} segments: '{text}'")
         
-        return True
+        return output_path
     except Exception as e:
         print(f"Sarvam TTS error: {e}")
         origin_logger.error(f"TTS Error: Sarvam failed to convert text to speech: {e}")
@@ -209,16 +313,18 @@ def speak_response(text):
     """
     Threaded playback of Sarvam TTS output
     """
-    global latest_audio_path, latest_audio_timestamp
+    global latest_audio_id, latest_audio_timestamp
     
-    if sarvam_tts(text):
+    response_id = uuid.uuid4().hex[:12]
+    output_path = sarvam_tts(text, response_id)
+    if output_path:
         try:
-            # Update the latest audio path and timestamp for web playback
-            latest_audio_path = os.path.abspath("response.wav")
+            # Update the latest audio ID and timestamp for web playback
+            latest_audio_id = response_id
             latest_audio_timestamp = time.time()
             
             # Play audio locally if needed
-            sound = AudioSegment.from_file("response.wav", format="wav")
+            sound = AudioSegment.from_file(output_path, format="wav")
             from pydub.playback import play
             play(sound)
             print("Played audio response using Sarvam TTS")
@@ -231,9 +337,22 @@ def speak_response(text):
 
 #Initialize Groq client
 MODEL="meta-llama/llama-4-scout-17b-16e-instruct"  # Using Llama 4 Scout model from Groq
-client = Groq(
+client = provider_clients.get("groq", lambda http_client: Groq(
     api_key=groq_api_key,
-)
+    http_client=http_client,
+    max_retries=0,  # 429s, 5xx and dropped connections are retried by the rate limiter instead
+))
+
+# Features the model turned down, so later turns don't request them only to fail
+model_capabilities = CapabilityCache(ttl=MODEL_CAPABILITY_TTL)
+
+# Every Groq call waits its turn here
+groq_limiters = {
+    "llm": TokenBucketLimiter(MODEL, requests_per_minute=GROQ_LLM_RPM, tokens_per_minute=GROQ_LLM_TPM or None,
+                              max_retries=GROQ_MAX_RETRIES, transient_retries=GROQ_TRANSIENT_RETRIES),
+    "stt": TokenBucketLimiter("whisper-large-v3-turbo", requests_per_minute=GROQ_STT_RPM,
+                              max_retries=GROQ_MAX_RETRIES, transient_retries=GROQ_TRANSIENT_RETRIES),
+}
 
 promptTeach= """You are an educational assistant designed to help students learn by solving questions step-by-step and providing helpful hints. When given a question, break down the solution into clear, manageable steps, but don't give all the steps or the final answer at once. Instead, offer hints to guide the student and encourage them to think critically. Your goal is to facilitate understanding and help the student arrive at the solution themselves.
 
@@ -262,9 +381,142 @@ promptHelp= """You are a helpful assistant. Examine the screenshot provided and
 Give concise answers not more than 20 words long. Help the user with their query based on what you can see in the image.
 Try to be CONCISE and formal."""
 
+# Screenshots are taken in the background while speech-to-text runs
+screen_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="screen")
+
+def capture_screenshot():
+    photo = pyautogui.screenshot()
+    image = prepare_image(photo, max_dimension=SCREENSHOT_MAX_DIMENSION,
+                          image_format=SCREENSHOT_FORMAT, quality=SCREENSHOT_QUALITY)
+    if model_capabilities.supports(MODEL, "image"):
+        image.data_url  # Encode here, off the critical path, since it will be sent
+    
+    # Log screenshot capture
+    origin_logger.info(f"Screenshot: {image.summary()}")
+    return image
+
+def prefetch_screenshot():
+    """
+    Start capturing the screen the moment an utterance is endpointed; the
+    future is queued along with that utterance
+    """
+    return screen_executor.submit(capture_screenshot)
+
+# Answer one captured utterance; runs on the pipeline workers, not the mic thread
+def process_utterance(accumulated_data, context=None):
+    """
+    Transcribe an utterance, look at the screen and speak the answer.
+    `context` is the screenshot future started when it was endpointed.
+    """
+    t0 = time.time()
+    
+    # Screen capture runs alongside transcription instead of after it
+    screenshot = context if context is not None else screen_executor.submit(capture_screenshot)
+    
+    #audio - wrap raw audio in an in-memory WAV without copying the buffer
+    captured_audio = wav_buffer(accumulated_data, rate=RATE)
+    if DEBUG_SAVE_AUDIO:
+        save_debug_audio(captured_audio, DEBUG_AUDIO_DIR)
+    t1 = time.time()
+    
+    # Log audio capture
+    origin_logger.info(f"Audio: Captured {len(accumulated_data)} bytes of audio data")
+    
+    # Transcription - Try Sarvam STT first, fall back to Groq
+    transcription = None
+    if sarvam_api_key:
+        # Use Sarvam's Speech-to-Text API
+        transcription = sarvam_stt(captured_audio)
+    
+    # Fall back to Groq if Sarvam failed or is not available
+    if not transcription:
+        transcription = groq_limiters["stt"].call(
+            provider_breakers["groq_stt"].call, transcribe_with, captured_audio, lambda audio_file: client.audio.transcriptions.create(
+                model="whisper-large-v3-turbo", 
+                file=audio_file, 
+                response_format="text"
+            )
+        )
+        # Log Groq transcription
+        input_logger.info(f"Transcription: {transcription}")
+        origin_logger.info(f"STT: Groq processed {audio_label(captured_audio)} to text")
+    
+    print("Question = ", transcription)
+    t2 = time.time()
+    
+    # Screenshot - captured in the background since the utterance was endpointed
+    image = screenshot.result()
+    
+    t3= time.time()
+    
+    #answer using Groq
+    QUESTION=transcription
+    
+    chat_completion = None
+    if model_capabilities.supports(MODEL, "image"):
+        # Create messages with text and image; the image is only encoded once it will be sent
+        messages = [
+            {"role": "system", "content": promptHelp},
+            {"role": "user", "content": [
+                {"type": "text", "text": QUESTION},
+                {"type": "image_url", "image_url": {
+                    "url": image.data_url
+                }}
+            ]}
+        ]
+        
+        try:
+            # Try with image input first
+            chat_completion = groq_limiters["llm"].call(
+                client.chat.completions.create,
+                tokens=estimate_text_tokens(promptHelp + QUESTION) + image.tokens,
+                messages=messages,
+                model=MODEL,
+                temperature=0.0,
+            )
+            origin_logger.info(f"LLM: Groq processed text+image query with model {MODEL}")
+        except Exception as e:
+            print(f"Image input not supported, falling back to text-only: {e}")
+            origin_logger.warning(f"LLM Error: Image input failed, falling back to text-only: {e}")
+            if is_capability_error(e):
+                # Later turns go straight to text until the capability TTL runs out
+                model_capabilities.mark_unsupported(MODEL, "image", e)
+    
+    if chat_completion is None:
+        # Text-only: the image failed, or the model is known to refuse images
+        chat_completion = groq_limiters["llm"].call(
+            client.chat.completions.create,
+            tokens=estimate_text_tokens(promptHelp + QUESTION),
+            messages=[
+                {"role": "system", "content": promptHelp},
+                {"role": "user", "content": QUESTION}
+            ],
+            model=MODEL,
+            temperature=0.0,
+        )
+        origin_logger.info(f"LLM: Groq processed text-only query with model {MODEL}")
+    
+    t4= time.time()
+    
+    answer = chat_completion.choices[0].message.content
+    print("Groq answer= ", answer)
+    
+    # Log the LLM response
+    output_logger.info(f"LLM Response: {answer}")
+    
+    if sarvam_api_key:
+        threading.Thread(target=speak_response, args=(answer,), daemon=True).start()
+
+utterance_pipeline = UtterancePipeline(
+    process_utterance,
+    workers=VOICE_WORKERS,
+    max_pending=VOICE_QUEUE_SIZE,
+    policy=VOICE_QUEUE_POLICY
+)
+
 # Start Flask web server for audio playback
 if __name__ == "__main__":
-    from flask import Flask, send_file, jsonify, render_template
+    from flask import Flask, send_file, jsonify, render_template, request
     import threading
     import time
     
@@ -308,7 +560,7 @@ if __name__ == "__main__":
                             if (data.available && data.timestamp > lastTimestamp) {
                                 lastTimestamp = data.timestamp;
                                 document.getElementById('status').textContent = 'New audio available! Playing...';
-                                document.getElementById('audio-player').src = '/get-audio?t=' + new Date().getTime();
+                                document.getElementById('audio-player').src = data.audio_url || '/get-audio?t=' + new Date().getTime();
                                 document.getElementById('audio-player').play().catch(e => console.error('Playback failed:', e));
                             }
                         })
@@ -324,12 +576,36 @@ if __name__ == "__main__":
         </html>
         """
     
-    @app.route('/get-audio')
-    def get_audio():
+    def send_artifact(artifact, max_age):
+        audio_format = negotiate_format(request.accept_mimetypes, delivery_formats,
+                                        requested=request.args.get("format"), default=AUDIO_DEFAULT_FORMAT)
+        audio = None
         try:
-            return send_file("response.wav", mimetype='audio/wav')
+            audio = audio_artifacts.variant(artifact["id"], audio_format)
         except Exception as e:
-            return jsonify({"error": str(e)}), 404
+            origin_logger.warning(f"Audio Artifacts: could not encode {artifact['id']} as {audio_format}, sending WAV: {e}")
+        if audio is None:
+            audio = audio_artifacts.variant(artifact["id"], "wav") or dict(artifact, mime="audio/wav")
+        
+        response = send_file(audio["path"], mimetype=audio["mime"], conditional=True,
+                             etag=audio["etag"], max_age=max_age)
+        response.headers["Accept-Ranges"] = "bytes"
+        response.headers["Vary"] = "Accept"
+        return response
+    
+    @app.route('/get-audio')
+    def get_audio():
+        artifact = audio_artifacts.latest()
+        if artifact is None:
+            return jsonify({"error": "No audio available"}), 404
+        return send_artifact(artifact, max_age=0)
+    
+    @app.route('/get-audio/<response_id>')
+    def get_response_audio(response_id):
+        artifact = audio_artifacts.get(response_id)
+        if artifact is None:
+            return jsonify({"error": "Unknown or expired response"}), 404
+        return send_artifact(artifact, max_age=AUDIO_RETENTION)
     
     @app.route('/audio-status')
     def audio_status():
@@ -337,7 +613,17 @@ if __name__ == "__main__":
         
         return jsonify({
             "timestamp": latest_audio_timestamp,
-            "available": os.path.exists("response.wav") and time.time() - latest_audio_timestamp < 30
+            "available": audio_artifacts.get(latest_audio_id) is not None and time.time() - latest_audio_timestamp < 30,
+            "audio_id": latest_audio_id,
+            "audio_url": f"/get-audio/{latest_audio_id}" if latest_audio_id else None,
+            "pipeline": utterance_pipeline.metrics(),
+            "vad": mic_endpointer.stats,
+            "connections": provider_clients.stats(),
+            "breakers": {name: breaker.snapshot() for name, breaker in provider_breakers.items()},
+            "rate_limits": {name: limiter.stats() for name, limiter in groq_limiters.items()},
+            "capabilities": model_capabilities.stats(),
+            "tts_cache": tts_cache.stats() if tts_cache else {"enabled": False},
+            "audio_artifacts": dict(audio_artifacts.stats(), formats=delivery_formats, default_format=AUDIO_DEFAULT_FORMAT)
         })
     
     # Start Flask in a separate thread
@@ -352,16 +638,10 @@ if __name__ == "__main__":
     def run_voice_assistant():
         global latest_audio_timestamp
         
-        # Initialize PyAudio
-        audio = pyaudio.PyAudio()
-        
-        # Initialize WebRTC VAD
-        vad = webrtcvad.Vad()
-        vad.set_mode(3)  # Aggressive mode for better voice detection
-        
         # Open audio stream to get audio from microphone
-        stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
-                           input=True, frames_per_buffer=CHUNK_SIZE)
+        source = MicrophoneSource(rate=RATE, channels=CHANNELS, frames_per_buffer=CHUNK_SIZE)
+        
+        utterance_pipeline.start()
         
         print("Listening...")
         print("NOTE: This assistant will process your voice input and screenshots.")
@@ -370,120 +650,9 @@ if __name__ == "__main__":
         print()
         
         try:
-            accumulated_data = b""
-            accumulated_silence = 0
-            while True:
-                chunk = stream.read(CHUNK_SIZE, exception_on_overflow=False) #read mic data
-                is_silent = is_silence(chunk)
-                if is_silent:
-                    accumulated_silence += CHUNK_DURATION_MS
-                    if accumulated_silence >= TARGET_DURATION_MS: # form Sentence after silence
-                        
-                        if accumulated_data != b"":
-                            t0 = time.time()
-                            
-                            #audio - convert raw audio to WAV format
-                            audio_stream = BytesIO(accumulated_data)
-                            # Create AudioSegment from raw PCM data
-                            audio_segment = AudioSegment(
-                                data=accumulated_data,
-                                sample_width=2,  # 16-bit audio
-                                frame_rate=16000,
-                                channels=1
-                            )
-                            # Export to WAV format
-                            audio_segment.export('output.wav', format='wav')
-                            t1 = time.time()
-                            
-                            # Log audio capture
-                            origin_logger.info(f"Audio: Captured {len(accumulated_data)} bytes of audio data")
-                            
-                            # Transcription - Try Sarvam STT first, fall back to Groq
-                            transcription = None
-                            if sarvam_api_key:
-                                # Use Sarvam's Speech-to-Text API
-                                transcription = sarvam_stt('output.wav')
-                            
-                            # Fall back to Groq if Sarvam failed or is not available
-                            if not transcription:
-                                audio_file = open("output.wav", "rb")
-                                transcription = client.audio.transcriptions.create(
-                                    model="whisper-large-v3-turbo", 
-                                    file=audio_file, 
-                                    response_format="text"
-                                )
-                                # Log Groq transcription
-                                input_logger.info(f"Transcription: {transcription}")
-                                origin_logger.info(f"STT: Groq processed audio file output.wav to text")
-                            
-                            print("Question = ", transcription)
-                            t2 = time.time()
-                            
-                            # Take Screenshots
-                            photo = pyautogui.screenshot()
-                            output = BytesIO()
-                            photo.save(output, format='PNG')
-                            im_data = output.getvalue()
-                            image_data = base64.b64encode(im_data).decode("utf-8")
-                            
-                            # Log screenshot capture
-                            origin_logger.info(f"Screenshot: Captured screen image for processing")
-                            
-                            t3= time.time()
-                            
-                            #answer using Groq
-                            QUESTION=transcription
-                            
-                            # Create messages with text and image
-                            messages = [
-                                {"role": "system", "content": promptHelp},
-                                {"role": "user", "content": [
-                                    {"type": "text", "text": QUESTION},
-                                    {"type": "image_url", "image_url": {
-                                        "url": f"data:image/png;base64,{image_data}"
-                                    }}
-                                ]}
-                            ]
-                            
-                            try:
-                                # Try with image input first
-                                chat_completion = client.chat.completions.create(
-                                    messages=messages,
-                                    model=MODEL,
-                                    temperature=0.0,
-                                )
-                                origin_logger.info(f"LLM: Groq processed text+image query with model {MODEL}")
-                            except Exception as e:
-                                print(f"Image input not supported, falling back to text-only: {e}")
-                                origin_logger.warning(f"LLM Error: Image input failed, falling back to text-only: {e}")
-                                # Fall back to text-only if image input fails
-                                chat_completion = client.chat.completions.create(
-                                    messages=[
-                                        {"role": "system", "content": promptHelp},
-                                        {"role": "user", "content": QUESTION}
-                                    ],
-                                    model=MODEL,
-                                    temperature=0.0,
-                                )
-                                origin_logger.info(f"LLM: Groq processed text-only query with model {MODEL}")
-                            
-                            t4= time.time()
-                            
-                            answer = chat_completion.choices[0].message.content
-                            print("Groq answer= ", answer)
-                            
-                            # Log the LLM response
-                            output_logger.info(f"LLM Response: {answer}")
-                            
-                            if sarvam_api_key:
-                                threading.Thread(target=speak_response, args=(answer,), daemon=True).start()
-                            
-                            accumulated_data=b""
-                        
-                        accumulated_silence = 0
-                else:
-                    accumulated_data += chunk
-                    accumulated_silence = 0
+            # Hand each utterance and its screenshot to the workers and go straight back to the mic
+            run_capture_loop(source, mic_endpointer,
+                             lambda pcm: utterance_pipeline.submit(pcm, context=prefetch_screenshot()))
         except KeyboardInterrupt:
             pass
         except Exception as e:
@@ -492,9 +661,8 @@ if __name__ == "__main__":
         finally:
             # Cleanup
             print("Stopping voice assistant...")
-            stream.stop_stream()
-            stream.close()
-            audio.terminate()
+            utterance_pipeline.stop(timeout=1)
+            source.close()
     
     # Start the voice assistant in a separate thread
     voice_thread = threading.Thread(target=run_voice_assistant, daemon=True)
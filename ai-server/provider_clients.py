@@ -0,0 +1,164 @@
+import re
+import threading
+import time
+
+import httpx
+
+
+class ProviderClientRegistry:
+    """
+    Creates each speech/LLM provider client once and shares a single
+    keep-alive httpx connection pool between them, so turns reuse open
+    TLS connections instead of handshaking on every call.
+
+    Every request is traced, so stats() shows how many requests went out
+    and how many of them had to open a new connection.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0, timeout=60.0):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self._http = None
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0}
+
+    def http_client(self):
+        """The shared, thread-safe httpx client backing every provider"""
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    limits=self.limits,
+                    timeout=self.timeout,
+                    event_hooks={"request": [self._trace_request]}
+                )
+            return self._http
+
+    def get(self, name, factory):
+        """
+        Return the client registered under `name`, creating it on first use
+        with factory(http_client)
+        """
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        http = self.http_client()
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = factory(http)
+            return self._clients[name]
+
+    def _trace_request(self, request):
+        self._count("requests")
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event, info):
+        if event == "connection.connect_tcp.complete":
+            self._count("connections_opened")
+        elif event == "connection.start_tls.complete":
+            self._count("tls_handshakes")
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            clients = sorted(self._clients)
+        reused = max(0, stats["requests"] - stats["connections_opened"])
+        return dict(
+            stats,
+            clients=clients,
+            reused_connections=reused,
+            reuse_ratio=round(reused / stats["requests"], 3) if stats["requests"] else None
+        )
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
+            self._clients.clear()
+
+
+# What providers say when a model refuses a kind of input, by capability
+CAPABILITY_REFUSALS = {
+    "image": re.compile(r"image|vision|multi-?modal|content must be a string", re.IGNORECASE),
+}
+# Errors that can mention the input without refusing it: an oversized image or a prompt over the context length
+NOT_A_REFUSAL = re.compile(r"too large|too long|too many|exceed|context.length|reduce the length", re.IGNORECASE)
+
+
+def is_capability_error(error, capability="image"):
+    """
+    Whether a provider error means the model refuses `capability` (such as
+    "this model does not support image input"). Only a 400, 404, 415 or
+    422 whose error code or message is about that input counts. A request
+    that is too large, a rate limit, an auth problem or a transient
+    network/server failure does not.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status not in (400, 404, 415, 422):
+        return False
+
+    details = [str(getattr(error, "code", None) or ""), str(getattr(error, "message", None) or error)]
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        body = body.get("error", body)
+    if isinstance(body, dict):
+        details.extend(str(body.get(field) or "") for field in ("code", "type", "message"))
+    elif body:
+        details.append(str(body))
+    text = " ".join(details)
+    return bool(CAPABILITY_REFUSALS[capability].search(text)) and not NOT_A_REFUSAL.search(text)
+
+
+class CapabilityCache:
+    """
+    Remembers which features (e.g. "image" input) a model refused, so later
+    requests skip straight to what it supports instead of failing first.
+
+    A refusal is trusted for ttl seconds, after which the feature is tried
+    again, in case the model or its deployment changed.
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._unsupported = {}
+        self._lock = threading.Lock()
+        self._stats = {"refusals": 0, "skipped": 0}
+
+    def supports(self, model, capability):
+        """False while a refusal of `capability` by `model` is remembered"""
+        key = (model, capability)
+        with self._lock:
+            refused = self._unsupported.get(key)
+            if refused is None:
+                return True
+            if time.time() - refused["at"] >= self.ttl:
+                del self._unsupported[key]
+                return True
+            self._stats["skipped"] += 1
+            return False
+
+    def mark_unsupported(self, model, capability, error=None):
+        with self._lock:
+            self._unsupported[(model, capability)] = {"at": time.time(), "error": str(error) if error else None}
+            self._stats["refusals"] += 1
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            unsupported = {
+                f"{model}:{capability}": {"error": refused["error"],
+                                          "retry_in_s": round(max(0.0, self.ttl - (now - refused["at"])))}
+                for (model, capability), refused in self._unsupported.items()
+            }
+            return dict(self._stats, unsupported=unsupported)
@@ -0,0 +1,191 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger('origin_logger')
+
+# Lower runs first: voice turns someone is waiting on, then background work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+def retry_after_seconds(error):
+    """
+    How long a rate-limited (HTTP 429) response asks us to wait, None if
+    the error isn't a rate limit, or 0 if it is but gives no Retry-After
+    """
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def is_transient_error(error):
+    """
+    Whether a failed call is worth repeating: a timeout, conflict or server
+    error response (408, 409, 5xx), or a dropped or timed-out connection
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in (408, 409) or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # The SDKs' own connection errors (e.g. groq.APIConnectionError, httpx.ConnectError) carry no status
+    return any(cls.__name__ in ("APIConnectionError", "APITimeoutError", "TransportError")
+               for cls in type(error).__mro__)
+
+
+class TokenBucketLimiter:
+    """
+    Process-wide rate limit for one provider model: a bucket of requests
+    and a bucket of tokens per minute, refilled continuously.
+
+    Callers wait in a priority queue, so a queued interactive turn goes
+    ahead of background work. When the provider answers 429 anyway, every
+    caller is paused for its Retry-After (or an exponential backoff) and
+    the call is retried up to max_retries times. A transient failure (5xx,
+    timeout, dropped connection) is retried up to transient_retries times
+    after a backoff of its own, without holding anyone else back.
+    """
+
+    def __init__(self, name, requests_per_minute=30, tokens_per_minute=None, max_retries=3,
+                 transient_retries=2, backoff_base=1.0, max_backoff=30.0):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.transient_retries = transient_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute or 0)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "waited": 0, "rate_limited": 0, "retries": 0, "transient_errors": 0,
+                       "total_wait_ms": 0.0, "max_wait_ms": 0.0}
+
+    def _refill(self, now):
+        elapsed = now - self._refilled
+        self._refilled = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _delay(self, now, tokens):
+        """Seconds until a request for `tokens` fits, 0 if it fits now"""
+        delay = max(0.0, self._paused_until - now)
+        if self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return delay
+
+    def acquire(self, tokens=0, priority=PRIORITY_INTERACTIVE):
+        """Block until this request may go out; returns the time waited in ms"""
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)  # A huge request still goes out once the bucket is full
+        started = time.monotonic()
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._delay(now, tokens)
+                if self._waiters[0] == entry and delay == 0:
+                    break
+                self._cond.wait(delay if self._waiters[0] == entry else None)
+            heapq.heappop(self._waiters)
+            self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+            self._cond.notify_all()
+
+            waited_ms = (time.monotonic() - started) * 1000
+            self._stats["calls"] += 1
+            self._stats["total_wait_ms"] += waited_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+            if waited_ms >= 1:
+                self._stats["waited"] += 1
+        return waited_ms
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once a call reports what it really used"""
+        if not self.tokens_per_minute or actual_tokens is None:
+            return
+        with self._cond:
+            self._tokens -= actual_tokens - min(estimated_tokens, self.tokens_per_minute)
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds`"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def call(self, fn, *args, tokens=0, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Run fn once the limiter allows it, retrying after 429 responses and
+        transient failures
+        """
+        rate_limited = transient = 0
+        while True:
+            self.acquire(tokens, priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    with self._cond:
+                        self._stats["rate_limited"] += 1
+                    if rate_limited == self.max_retries:
+                        raise
+                    if not retry_after:
+                        retry_after = self._backoff(rate_limited)
+                    rate_limited += 1
+                    logger.warning(f"Rate limit: {self.name} returned 429, retrying in {retry_after:.1f}s")
+                    self.pause(retry_after)
+                elif is_transient_error(e):
+                    with self._cond:
+                        self._stats["transient_errors"] += 1
+                    if transient == self.transient_retries:
+                        raise
+                    delay = self._backoff(transient)
+                    transient += 1
+                    logger.warning(f"Rate limit: {self.name} call failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                else:
+                    raise
+                with self._cond:
+                    self._stats["retries"] += 1
+
+    def _backoff(self, attempt):
+        return min(self.max_backoff, self.backoff_base * 2 ** attempt) * random.uniform(0.8, 1.2)
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            stats = dict(self._stats)
+            calls = stats["calls"]
+            stats["avg_wait_ms"] = round(stats.pop("total_wait_ms") / calls, 1) if calls else None
+            stats["max_wait_ms"] = round(stats["max_wait_ms"], 1)
+            stats["queued"] = len(self._waiters)
+            stats["requests_available"] = round(self._requests, 1)
+            stats["tokens_available"] = round(self._tokens) if self.tokens_per_minute else None
+            stats["paused_for_s"] = round(max(0.0, self._paused_until - time.monotonic()), 1)
+        return stats
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Replay recorded WAV fixtures through the voice assistant and report
+per-utterance timings.
+
+Recordings go through the same endpointer, utterance pipeline and
+process_voice_input path as the live microphone, so this measures
+endpointing latency and end-to-end turn time on a headless machine.
+
+    python replay_benchmark.py fixtures/*.wav --speed 4 --output timings.jsonl
+    python replay_benchmark.py fixtures/*.wav --speed 0 --endpoint-only
+
+Recordings must be 16 kHz, 16-bit WAV. Full turns call the real STT/LLM
+providers, so GROQ_API_KEY (and SARVAM_API_KEY) must be set.
+--endpoint-only never sets up the providers, so it needs no keys.
+
+endpoint_ms is measured in audio time: how much audio after the last
+voiced frame the endpointer needed to end the utterance. It is the same
+at any --speed. queue_wait_ms and turn_ms are wall-clock times.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from audio_capture import RATE, create_endpointer, run_capture_loop
+from audio_sources import WavReplaySource
+from capture_pipeline import UtterancePipeline
+
+TIMING_FIELDS = ["endpoint_ms", "queue_wait_ms", "stt_ms", "screenshot_ms", "llm_ms", "total_ms", "turn_ms"]
+
+
+def replay_file(path, speed=1.0, endpoint_only=False):
+    """
+    Replay one recording and return a timing record per detected utterance
+    """
+    if not endpoint_only:
+        # Importing voice sets up the STT/LLM/TTS providers (and prompts for missing API keys)
+        import voice
+
+    source = WavReplaySource(path, rate=RATE, speed=speed)
+    endpointer = create_endpointer()
+    records = []
+
+    def handle(pcm, index):
+        record = records[index]
+        record["queue_wait_ms"] = round((time.monotonic() - record["endpointed_at"]) * 1000)
+        if not endpoint_only:
+            result = voice.process_captured_utterance(pcm)
+            if result:
+                record["transcription"] = result["transcription"]
+                record["response"] = result["response"]
+                record.update(result["timings"])
+        # Endpoint to answer, including the time spent waiting for a worker
+        record["turn_ms"] = round((time.monotonic() - record.pop("endpointed_at")) * 1000)
+
+    # Block rather than drop so every utterance in the recording is measured
+    pipeline = UtterancePipeline(handle, workers=1, max_pending=8, policy="block", name="replay").start()
+
+    def on_utterance(pcm):
+        endpoint = endpointer.last_endpoint
+        records.append({
+            "file": path,
+            "index": len(records),
+            "audio_position_ms": endpoint["position_ms"],
+            "utterance_ms": round(len(pcm) / 2 / RATE * 1000),
+            "endpoint_ms": endpoint["latency_ms"],
+            "endpointed_at": time.monotonic(),
+        })
+        pipeline.submit(pcm, len(records) - 1)
+
+    started = time.monotonic()
+    run_capture_loop(source, endpointer, on_utterance)
+    pipeline.stop()
+    source.close()
+
+    print(f"{path}: {len(records)} utterances from {source.duration_ms / 1000:.1f}s of audio "
+          f"in {time.monotonic() - started:.1f}s, VAD {endpointer.stats}", file=sys.stderr)
+    return records
+
+
+def summarize(records):
+    """p50/p95/max for every timing field present in the records"""
+    summary = {}
+    for field in TIMING_FIELDS:
+        values = sorted(record[field] for record in records if record.get(field) is not None)
+        if not values:
+            continue
+        summary[field] = {
+            "p50": statistics.median(values),
+            "p95": values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+            "max": values[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAV recordings through the voice pipeline")
+    parser.add_argument("files", nargs="+", help="16 kHz, 16-bit WAV recordings")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 4 = 4x faster, 0 = no pacing")
+    parser.add_argument("--endpoint-only", action="store_true", help="Only measure endpointing, skip STT/LLM/TTS")
+    parser.add_argument("--output", help="Write one JSON record per utterance to this file")
+    args = parser.parse_args()
+
+    records = []
+    for path in args.files:
+        records.extend(replay_file(path, speed=args.speed, endpoint_only=args.endpoint_only))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            for record in records:
+                output.write(json.dumps(record) + "\n")
+
+    print(json.dumps({"utterances": len(records), "speed": args.speed, "timings": summarize(records)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
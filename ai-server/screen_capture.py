@@ -0,0 +1,340 @@
+import base64
+import collections
+import hashlib
+import math
+import threading
+from io import BytesIO
+
+from PIL import Image, ImageChops
+
+try:
+    import pytesseract
+except ImportError:  # OCR is optional
+    pytesseract = None
+
+# Vision token estimate: the model sees the image as 336px tiles of ~144 tokens each
+TOKEN_TILE_PX = 336
+TOKENS_PER_TILE = 144
+
+IMAGE_FORMATS = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+# How screen context is sent to the model: the image, OCR text, both, or
+# OCR text for text-heavy screens and the image otherwise
+SCREEN_CONTEXT_MODES = ("image", "ocr", "both", "auto")
+
+
+def estimate_image_tokens(width, height):
+    """Rough number of vision tokens an image of this size costs"""
+    return math.ceil(width / TOKEN_TILE_PX) * math.ceil(height / TOKEN_TILE_PX) * TOKENS_PER_TILE
+
+
+def estimate_text_tokens(text):
+    """Rough number of tokens in English text (about 4 characters each)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+class PreparedImage:
+    """
+    A downscaled screenshot, ready to attach to an LLM message. The
+    base64 data URL is only encoded the first time it is asked for, so a
+    turn that ends up sending text (OCR, a cached description, a model
+    without vision) never pays for it.
+    """
+
+    def __init__(self, photo, mime, image_format, quality, original_size):
+        self.mime = mime
+        self.image_format = image_format
+        self.quality = quality
+        self.size = photo.size
+        self.original_size = original_size
+        self.encoded_bytes = None  # Known once encoded
+        self.screen_hash = None  # Fingerprint key of the screen, set by ScreenCache
+        self.description = None  # Optional text stand-in for the image
+        self.ocr_text = None  # Text read off the screen, when OCR is enabled
+        self.ocr_ms = None
+        self._photo = photo
+        self._data_url = None
+        self._lock = threading.Lock()
+
+    @property
+    def data_url(self):
+        with self._lock:
+            if self._data_url is None:
+                output = BytesIO()
+                if self.image_format == "PNG":
+                    self._photo.save(output, format="PNG")
+                else:
+                    self._photo.save(output, format=self.image_format, quality=self.quality)
+                encoded = output.getbuffer()
+                self._data_url = f"data:{self.mime};base64," + base64.b64encode(encoded).decode("ascii")
+                self.encoded_bytes = len(encoded)
+                self._photo = None  # Only the encoding is needed from here on
+            return self._data_url
+
+    @property
+    def encoded(self):
+        return self._data_url is not None
+
+    @property
+    def tokens(self):
+        return estimate_image_tokens(*self.size)
+
+    @property
+    def original_tokens(self):
+        return estimate_image_tokens(*self.original_size)
+
+    @property
+    def raw_bytes(self):
+        """Size of the original capture as uncompressed RGB"""
+        return self.original_size[0] * self.original_size[1] * 3
+
+    def summary(self):
+        (width, height), (original_width, original_height) = self.size, self.original_size
+        if self.encoded_bytes is None:
+            encoding = f"{self.mime}, not encoded (not sent as an image)"
+        else:
+            encoding = (f"{self.mime}, {self.encoded_bytes} bytes "
+                        f"({self.raw_bytes - self.encoded_bytes} saved vs {self.raw_bytes} raw)")
+        return (f"{original_width}x{original_height} -> {width}x{height} {encoding}, "
+                f"~{self.tokens} tokens ({self.original_tokens - self.tokens} saved)")
+
+
+def prepare_image(photo, max_dimension=1568, image_format="JPEG", quality=80):
+    """
+    Downscale a PIL image so its longest side is at most max_dimension.
+    It is encoded as JPEG/WebP (or PNG), in one pass straight to a base64
+    data URL, only when PreparedImage.data_url is first read.
+    """
+    image_format = image_format.upper()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format {image_format!r}; expected one of {sorted(IMAGE_FORMATS)}")
+    mime = IMAGE_FORMATS[image_format]
+
+    original_size = photo.size
+    scale = max_dimension / max(original_size) if max_dimension else 1
+    if scale < 1:
+        size = (max(1, round(original_size[0] * scale)), max(1, round(original_size[1] * scale)))
+        # reducing_gap shrinks by whole factors first, which is much faster on large screens
+        photo = photo.resize(size, Image.BICUBIC, reducing_gap=2.0)
+    if image_format != "PNG" and photo.mode not in ("RGB", "L"):
+        photo = photo.convert("RGB")
+
+    return PreparedImage(photo, mime, image_format, quality, original_size)
+
+
+def extract_text(photo, max_chars=4000):
+    """
+    Read the text on a screenshot with Tesseract and compact it: blank
+    lines and repeated whitespace are dropped and the result is capped at
+    max_chars. Returns None if pytesseract isn't installed.
+    """
+    if pytesseract is None:
+        return None
+    raw = pytesseract.image_to_string(photo.convert("L"))
+    lines = (" ".join(line.split()) for line in raw.splitlines())
+    text = "\n".join(line for line in lines if line)
+    return text[:max_chars]
+
+
+class ScreenContextStats:
+    """Per screen-context mode: how many turns used it, and their average cost"""
+
+    def __init__(self):
+        self._modes = {}
+        self._lock = threading.Lock()
+
+    def record(self, mode, screen_tokens, llm_ms, prompt_tokens=None, ocr_ms=None):
+        with self._lock:
+            totals = self._modes.setdefault(mode, collections.Counter())
+            totals["turns"] += 1
+            totals["screen_tokens"] += screen_tokens
+            totals["llm_ms"] += llm_ms
+            if prompt_tokens is not None:
+                totals["reported_turns"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+            if ocr_ms is not None:
+                totals["ocr_turns"] += 1
+                totals["ocr_ms"] += ocr_ms
+
+    def snapshot(self):
+        with self._lock:
+            modes = {mode: dict(totals) for mode, totals in self._modes.items()}
+        summary = {}
+        for mode, totals in modes.items():
+            turns = totals["turns"]
+            summary[mode] = {
+                "turns": turns,
+                "avg_screen_tokens": round(totals["screen_tokens"] / turns),
+                "avg_prompt_tokens": round(totals["prompt_tokens"] / totals["reported_turns"]) if totals.get("reported_turns") else None,
+                "avg_llm_ms": round(totals["llm_ms"] / turns),
+                "avg_ocr_ms": round(totals["ocr_ms"] / totals["ocr_turns"]) if totals.get("ocr_turns") else None,
+            }
+        return summary
+
+
+# Regions smaller than this on either side are ignored in favour of the full screen
+MIN_REGION_PX = 32
+
+
+def parse_region(value):
+    """
+    Turn a {"x", "y", "width", "height"} mapping (screen points, as the
+    browser reports them) into a (left, top, width, height) tuple.
+    Raises ValueError if it isn't a usable box.
+    """
+    try:
+        region = tuple(int(round(float(value[key]))) for key in ("x", "y", "width", "height"))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("region needs numeric x, y, width and height")
+    if region[2] < MIN_REGION_PX or region[3] < MIN_REGION_PX:
+        raise ValueError(f"region must be at least {MIN_REGION_PX}x{MIN_REGION_PX}")
+    return region
+
+
+def active_window_region():
+    """
+    Bounding box of the focused window, or None where it can't be found.
+    pygetwindow (installed with pyautogui on Windows and macOS) is optional.
+    """
+    try:
+        import pygetwindow
+        window = pygetwindow.getActiveWindow()
+    except Exception:
+        return None
+    if window is None or window.width < MIN_REGION_PX or window.height < MIN_REGION_PX:
+        return None
+    return (window.left, window.top, window.width, window.height)
+
+
+def crop_to_region(photo, region, screen_size):
+    """
+    Crop a full-screen capture to a region given in screen points. The
+    capture may be larger than the screen in points (HiDPI displays), so
+    the region is scaled to capture pixels first. Returns None if the
+    region lies (almost) entirely off screen.
+    """
+    scale_x = photo.width / screen_size[0]
+    scale_y = photo.height / screen_size[1]
+    left, top, width, height = region
+    box = (
+        max(0, round(left * scale_x)),
+        max(0, round(top * scale_y)),
+        min(photo.width, round((left + width) * scale_x)),
+        min(photo.height, round((top + height) * scale_y)),
+    )
+    if box[2] - box[0] < MIN_REGION_PX or box[3] - box[1] < MIN_REGION_PX:
+        return None
+    return photo.crop(box)
+
+
+def perceptual_hash(photo, hash_size=16):
+    """
+    Difference hash of an image: one bit per horizontally adjacent pixel
+    pair of a tiny grayscale copy. Similar screens give hashes that differ
+    in only a few bits. It is too coarse to tell text screens apart (a few
+    changed lines of code flip only a handful of bits), so it only picks
+    candidates; screen_fingerprint's thumbnail decides.
+    """
+    small = photo.resize((hash_size + 1, hash_size), Image.BOX).convert("L")
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+# Screens are compared pixel for pixel at this width; the height keeps the aspect ratio.
+# A 1920px screen is averaged over 7.5px blocks, so a changed line of text still changes pixels.
+THUMBNAIL_WIDTH = 256
+
+
+def screen_fingerprint(photo, hash_size=16, thumbnail_width=THUMBNAIL_WIDTH):
+    """
+    What identifies a screen: a small grayscale thumbnail, its perceptual
+    hash and "key", a digest of the thumbnail's pixels. Screens with the
+    same key look the same at thumbnail size.
+    """
+    height = max(1, round(photo.height * thumbnail_width / photo.width))
+    thumbnail = photo.resize((thumbnail_width, height), Image.BOX).convert("L")
+    return {
+        "hash": perceptual_hash(thumbnail, hash_size),
+        "thumbnail": thumbnail,
+        "key": hashlib.blake2b(thumbnail.tobytes(), digest_size=8).hexdigest(),
+    }
+
+
+def changed_pixels(a, b):
+    """How many pixels differ between two thumbnails; every one of them if the sizes differ"""
+    if a.size != b.size:
+        return a.width * a.height
+    return sum(ImageChops.difference(a, b).histogram()[1:])
+
+
+class ScreenCache:
+    """
+    Remembers the last few encoded screenshots, so a screen that hasn't
+    changed reuses the already encoded image and any description of it.
+
+    A cached screen is reused only when its perceptual hash is within
+    max_distance bits and its thumbnail differs in at most
+    max_changed_pixels pixels. Both default to 0: any visible change, even
+    a blinking cursor, costs a fresh encode, rather than risk showing the
+    model (and keying the answer cache on) a screen with stale text.
+    """
+
+    def __init__(self, max_distance=0, max_changed_pixels=0, max_entries=8, hash_size=16):
+        self.max_distance = max_distance
+        self.max_changed_pixels = max_changed_pixels
+        self.max_entries = max_entries
+        self.hash_size = hash_size
+        self._entries = collections.OrderedDict()  # fingerprint key -> (fingerprint, image)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "description_hits": 0, "bytes_saved": 0}
+
+    def lookup(self, photo):
+        """
+        Returns (fingerprint, cached PreparedImage or None)
+        """
+        fingerprint = screen_fingerprint(photo, self.hash_size)
+        with self._lock:
+            best, best_difference = None, None
+            for key, (cached, image) in self._entries.items():
+                if bin(cached["hash"] ^ fingerprint["hash"]).count("1") > self.max_distance:
+                    continue
+                difference = changed_pixels(cached["thumbnail"], fingerprint["thumbnail"])
+                if difference <= self.max_changed_pixels and (best is None or difference < best_difference):
+                    best, best_difference = key, difference
+            if best is None:
+                self._stats["misses"] += 1
+                return fingerprint, None
+            self._entries.move_to_end(best)
+            image = self._entries[best][1]
+            self._stats["hits"] += 1
+            self._stats["bytes_saved"] += image.encoded_bytes or 0
+            return fingerprint, image
+
+    def store(self, fingerprint, image):
+        image.screen_hash = fingerprint["key"]
+        with self._lock:
+            self._entries[fingerprint["key"]] = (fingerprint, image)
+            self._entries.move_to_end(fingerprint["key"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return image
+
+    def description_for(self, image):
+        """The cached description of a screen, counted as a description hit"""
+        description = image.description
+        if description:
+            with self._lock:
+                self._stats["description_hits"] += 1
+        return description
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
@@ -0,0 +1,192 @@
+import concurrent.futures
+import logging
+import re
+import threading
+import time
+import uuid
+
+from audio_buffer import join_wavs
+
+logger = logging.getLogger('origin_logger')
+
+# End of a sentence: terminal punctuation (optionally followed by closing quotes/brackets) and whitespace
+SENTENCE_END = re.compile(r"""[.!?…]+["')\]]*\s+""")
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed LLM text into sentences as soon as they are complete.
+    Sentences shorter than min_chars are held back and joined with the next
+    one, so the TTS isn't called for fragments like "Sure!".
+    """
+
+    def __init__(self, min_chars=20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add streamed text; returns the sentences it completed"""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            if match.end() - start >= self.min_chars:
+                sentences.append(self._buffer[start:match.end()].strip())
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Whatever is left once the stream ends"""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest or None
+
+
+def split_long(text, max_chars):
+    """
+    Cut a sentence longer than max_chars (the TTS request limit) into
+    pieces, at the last clause break or space before the limit
+    """
+    pieces = []
+    while len(text) > max_chars:
+        cut = max(text.rfind(", ", 0, max_chars), text.rfind("; ", 0, max_chars))
+        if cut < max_chars // 2:
+            cut = text.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars - 1
+        pieces.append(text[:cut + 1].strip())
+        text = text[cut + 1:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+# Used when a stream isn't given a shared executor: one sentence at a time
+_sequential = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+
+
+class SpeechStream:
+    """
+    Speaks an answer sentence by sentence, while it is still being
+    generated or as soon as it is known.
+
+    feed() the answer text as it arrives. Each complete sentence (cut to
+    at most max_chars) is synthesized with `synthesize(text)`, which
+    returns WAV bytes, on `executor`. A shared executor bounds how many
+    TTS calls run at once across every answer, and lets the sentences of
+    a long answer be synthesized in parallel. Segments keep their order
+    however they complete, and each becomes playable straight away.
+    finish() marks the end of the text. Once every segment is
+    synthesized, on_done(stream) is called.
+    """
+
+    def __init__(self, synthesize, min_chars=20, started=None, on_done=None, executor=None, max_chars=500,
+                 response_id=None):
+        self.response_id = response_id or uuid.uuid4().hex[:12]
+        self.synthesize = synthesize
+        self.started = started or time.time()
+        self.on_done = on_done
+        self.max_chars = max_chars
+        self.segments = []
+        self.first_audio_ms = None
+        self.finished = False  # No more text is coming
+        self.done = False  # Every segment has been synthesized
+        self._splitter = SentenceSplitter(min_chars)
+        self._executor = executor or _sequential
+        self._outstanding = 0
+        self._cond = threading.Condition()
+
+    def feed(self, text):
+        for sentence in self._splitter.feed(text):
+            self._add(sentence)
+
+    def finish(self):
+        if self.finished:
+            return
+        rest = self._splitter.flush()
+        if rest:
+            self._add(rest)
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+        self._check_done()
+
+    @property
+    def text(self):
+        with self._cond:
+            return " ".join(segment["text"] for segment in self.segments)
+
+    def _add(self, sentence):
+        for piece in split_long(sentence, self.max_chars):
+            with self._cond:
+                segment = {"index": len(self.segments), "text": piece, "audio": None, "error": None}
+                self.segments.append(segment)
+                self._outstanding += 1
+            self._executor.submit(self._synthesize, segment)
+
+    def _synthesize(self, segment):
+        try:
+            audio = self.synthesize(segment["text"])
+            error = None if audio else "no audio"
+        except Exception as e:
+            audio, error = None, str(e)
+            logger.error(f"TTS Error: segment {segment['index']} of {self.response_id}: {e}")
+        with self._cond:
+            segment["audio"], segment["error"] = audio, error
+            self._outstanding -= 1
+            if self.first_audio_ms is None:
+                # Playable once every earlier segment is resolved, since they are played in order
+                for earlier in self.segments:
+                    if earlier["audio"] is not None:
+                        self.first_audio_ms = round((time.time() - self.started) * 1000)
+                        logger.info(f"TTS: first segment of {self.response_id} ready {self.first_audio_ms}ms after the turn started")
+                        break
+                    if earlier["error"] is None:
+                        break
+            self._cond.notify_all()
+        self._check_done()
+
+    def _check_done(self):
+        with self._cond:
+            if self.done or not self.finished or self._outstanding:
+                return
+            self.done = True
+            self._cond.notify_all()
+        if self.on_done:
+            self.on_done(self)
+
+    def wait_for_segment(self, index, timeout=30):
+        """
+        Block until segment `index` is synthesized. Returns the segment, or
+        None if the answer ended without it (or the timeout expired).
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                if index < len(self.segments):
+                    segment = self.segments[index]
+                    if segment["audio"] is not None or segment["error"] is not None:
+                        return segment
+                elif self.finished:
+                    return None
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def wav(self):
+        """Every synthesized segment joined into one WAV"""
+        with self._cond:
+            return join_wavs(segment["audio"] for segment in self.segments if segment["audio"])
+
+    def status(self):
+        with self._cond:
+            return {
+                "response_id": self.response_id,
+                "segments": [{"index": segment["index"], "text": segment["text"],
+                              "ready": segment["audio"] is not None, "error": segment["error"]}
+                             for segment in self.segments],
+                "finished": self.finished,
+                "done": self.done,
+                "first_audio_ms": self.first_audio_ms,
+            }
@@ -0,0 +1,121 @@
+import collections
+import threading
+import time
+
+from endpointing import Endpointer
+
+
+class StreamSession:
+    """
+    Server-side state for one browser streaming microphone audio: its own
+    Endpointer, conversation and status, plus the most recent answers
+    produced for it. Nothing here is shared with other sessions or with
+    the desktop assistant.
+    """
+
+    def __init__(self, session_id, endpointer, max_results=10):
+        self.session_id = session_id
+        self.endpointer = endpointer
+        self.lock = threading.Lock()  # Frames from one session are endpointed in order
+        self.created = time.time()
+        self.last_seen = self.created
+        self.bytes_received = 0
+        self.utterances = 0
+        self.results = collections.deque(maxlen=max_results)
+        self.conversation = []  # This learner's questions and answers, oldest first
+        self.voice_status = {"processing": False, "speaking": False}
+
+    def feed(self, data):
+        with self.lock:
+            self.last_seen = time.time()
+            self.bytes_received += len(data)
+            finished = self.endpointer.feed(data)
+            self.utterances += len(finished)
+            return finished
+
+    def flush(self):
+        with self.lock:
+            utterance = self.endpointer.flush()
+            if utterance is not None:
+                self.utterances += 1
+            return utterance
+
+    def status(self):
+        return {
+            "session_id": self.session_id,
+            "in_speech": self.endpointer.in_speech,
+            "bytes_received": self.bytes_received,
+            "utterances": self.utterances,
+            "voice_status": dict(self.voice_status),
+            "idle_seconds": round(time.time() - self.last_seen, 1),
+        }
+
+
+class StreamSessionManager:
+    """
+    Registry of active streaming sessions. Sessions are created on first use
+    and expire after idle_timeout seconds without audio; idle sessions are
+    swept at most every sweep_interval seconds as sessions are looked up,
+    and whenever the registry is full.
+    """
+
+    def __init__(self, endpointer_factory=Endpointer, max_sessions=500, idle_timeout=300, sweep_interval=30):
+        self.endpointer_factory = endpointer_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._swept = time.time()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id):
+        """Return the session, creating it if needed. None if the server is full."""
+        with self._lock:
+            if time.time() - self._swept >= self.sweep_interval:
+                self._expire_idle()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return session
+            if len(self._sessions) >= self.max_sessions:
+                self._expire_idle()
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session = StreamSession(session_id, self.endpointer_factory())
+            self._sessions[session_id] = session
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def expire_idle(self):
+        with self._lock:
+            return self._expire_idle()
+
+    def _expire_idle(self):
+        self._swept = time.time()
+        cutoff = self._swept - self.idle_timeout
+        expired = [sid for sid, session in self._sessions.items() if session.last_seen < cutoff]
+        for sid in expired:
+            del self._sessions[sid]
+        return expired
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        vad = collections.Counter()
+        for session in sessions:
+            vad.update(session.endpointer.stats)
+        return {
+            "active_sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "in_speech": sum(1 for session in sessions if session.endpointer.in_speech),
+            "vad": dict(vad),
+        }
@@ -0,0 +1,158 @@
+import bisect
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from audio_buffer import clone_audio
+from circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger('origin_logger')
+
+# Upper bounds (ms) of the latency histogram buckets reported by stats()
+LATENCY_BUCKETS_MS = [250, 500, 1000, 2000, 4000, 8000]
+
+
+class LatencyHistogram:
+    """
+    Latency record for one provider: fixed buckets for reporting plus a
+    rolling window of recent successful calls for quantiles.
+    """
+
+    def __init__(self, window=100):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.recent = collections.deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+        self.abandoned = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms, success):
+        with self._lock:
+            self.calls += 1
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            if success:
+                self.recent.append(latency_ms)
+            else:
+                self.failures += 1
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def quantile(self, q):
+        with self._lock:
+            values = sorted(self.recent)
+        if not values:
+            return None
+        return round(values[min(len(values) - 1, int(q * len(values)))], 1)
+
+    def snapshot(self):
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            buckets = dict(zip(labels, self.buckets))
+            counts = {"calls": self.calls, "failures": self.failures, "wins": self.wins,
+                      "abandoned": self.abandoned, "skipped": self.skipped}
+        return dict(counts, p50_ms=self.quantile(0.5), p95_ms=self.quantile(0.95), buckets=buckets)
+
+
+class HedgedSTTRouter:
+    """
+    Runs speech-to-text providers in preference order, hedging instead of
+    waiting for the primary to fail.
+
+    The primary provider starts immediately. If it has not produced a
+    transcription within the hedge delay, or it fails or returns nothing
+    sooner, the next provider is started too and the first good result
+    wins. When adaptive, the hedge delay tracks the primary's recent
+    latency quantile, clamped to [min_delay_ms, max_delay_ms].
+
+    Providers are callables taking an audio path or WAV buffer and
+    returning text (or None). A provider that raises CircuitOpenError is
+    skipped immediately. A losing call that is already running cannot
+    be interrupted; its result is discarded and counted as abandoned.
+    """
+
+    def __init__(self, providers, hedge_delay_ms=1500, adaptive=True, quantile=0.95,
+                 min_delay_ms=300, max_delay_ms=5000, min_samples=10, max_workers=8):
+        self.providers = list(providers)
+        self.hedge_delay_ms = hedge_delay_ms
+        self.adaptive = adaptive
+        self.quantile = quantile
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.min_samples = min_samples
+        self.histograms = {name: LatencyHistogram() for name, _ in self.providers}
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stt")
+
+    def current_hedge_delay_ms(self):
+        if not self.adaptive or not self.providers:
+            return self.hedge_delay_ms
+        primary = self.histograms[self.providers[0][0]]
+        if len(primary.recent) < self.min_samples:
+            return self.hedge_delay_ms
+        return max(self.min_delay_ms, min(self.max_delay_ms, primary.quantile(self.quantile)))
+
+    def _call(self, name, transcribe, audio):
+        started = time.time()
+        try:
+            text = transcribe(audio)
+        except CircuitOpenError:
+            # Provider is being skipped; the next one starts straight away
+            self.histograms[name].count("skipped")
+            return None
+        except Exception as e:
+            logger.error(f"STT Error: {name} raised: {e}")
+            text = None
+        success = bool(text and str(text).strip())
+        self.histograms[name].record((time.time() - started) * 1000, success)
+        return text if success else None
+
+    def transcribe(self, audio):
+        """
+        Returns (text, provider_name), or (None, None) if every provider failed
+        """
+        remaining = list(self.providers)
+        running = {}
+
+        def start_next():
+            name, transcribe = remaining.pop(0)
+            # Each provider reads its own copy so hedged calls don't share a file position
+            running[self._executor.submit(self._call, name, transcribe, clone_audio(audio))] = name
+
+        start_next()
+        hedge_delay_ms = self.current_hedge_delay_ms()
+        deadline = time.time() + hedge_delay_ms / 1000
+
+        while running:
+            timeout = max(0, deadline - time.time()) if remaining else None
+            done, _ = concurrent.futures.wait(running, timeout=timeout,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                text = future.result()
+                if text:
+                    self.histograms[name].count("wins")
+                    for loser, loser_name in running.items():
+                        if not loser.cancel():
+                            self.histograms[loser_name].count("abandoned")
+                    if name != self.providers[0][0]:
+                        logger.info(f"STT: {name} answered after hedging at {hedge_delay_ms:.0f}ms")
+                    return text, name
+
+            # Hedge when the delay expires, or straight away if everything running has failed
+            if remaining and (not done and time.time() >= deadline or not running):
+                start_next()
+                deadline = time.time() + self.current_hedge_delay_ms() / 1000
+
+        return None, None
+
+    def stats(self):
+        return {
+            "hedge_delay_ms": round(self.current_hedge_delay_ms()),
+            "adaptive": self.adaptive,
+            "providers": {name: histogram.snapshot() for name, histogram in self.histograms.items()},
+        }
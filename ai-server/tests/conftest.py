@@ -0,0 +1,22 @@
+import os
+import sys
+import types
+
+import pytest
+
+# The server's modules are flat files in ai-server/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeStatusError(Exception):
+    """An SDK-style HTTP error: status_code plus a response carrying headers"""
+
+    def __init__(self, status_code, headers=None, message=None):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+@pytest.fixture
+def status_error():
+    return FakeStatusError
@@ -0,0 +1,58 @@
+from answer_cache import AnswerCache, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question("  What's   NEXT?! ") == "what s next"
+
+
+def test_exact_hit_on_the_same_screen_and_history():
+    cache = AnswerCache()
+    cache.store("What is X?", "screen", "X is 4", llm_ms=900, context="history")
+    hit = cache.lookup("what is x", "screen", context="history")
+    assert hit == {"answer": "X is 4", "question": "What is X?", "match": "exact", "llm_ms": 900}
+    assert cache.stats()["saved_ms"] == 900
+
+
+def test_different_screen_or_history_misses():
+    cache = AnswerCache()
+    cache.store("what's next", "screen", "Step 2", context="after step 1")
+    assert cache.lookup("what's next", "other screen", context="after step 1") is None
+    assert cache.lookup("what's next", "screen", context="after step 2") is None
+    assert cache.lookup("what's next", "screen") is None
+
+
+def test_fuzzy_matching_is_off_by_default():
+    cache = AnswerCache()
+    cache.store("what is the value of x", "screen", "4")
+    assert cache.lookup("what's the value of x please", "screen") is None
+
+
+def test_fuzzy_match_needs_the_same_content_words():
+    cache = AnswerCache(similarity=0.6)
+    cache.store("what is the value of x", "screen", "4")
+    assert cache.lookup("what's the value of x please", "screen")["match"] == "fuzzy"
+    assert cache.lookup("what is the value of y", "screen") is None
+
+
+def test_fuzzy_match_needs_a_known_screen():
+    cache = AnswerCache(similarity=0.6)
+    cache.store("what is the value of x", None, "4")
+    assert cache.lookup("what's the value of x please", None) is None
+
+
+def test_entries_expire():
+    cache = AnswerCache(ttl=0)
+    cache.store("question", "screen", "answer")
+    cache._entries[next(iter(cache._entries))]["created"] -= 1
+    assert cache.lookup("question", "screen") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.store("one", "s", "1")
+    cache.store("two", "s", "2")
+    cache.lookup("one", "s")
+    cache.store("three", "s", "3")
+    assert cache.lookup("two", "s") is None
+    assert cache.lookup("one", "s")["answer"] == "1"
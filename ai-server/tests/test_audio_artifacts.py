@@ -0,0 +1,102 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from audio_artifacts import AudioArtifactStore
+
+
+def test_publish_and_get(tmp_path):
+    store = AudioArtifactStore(str(tmp_path))
+    artifact = store.publish("abc123", b"RIFFwav")
+    assert store.get("abc123") is artifact
+    assert artifact["size"] == 7 and len(artifact["etag"]) == 32
+    assert store.latest() is artifact
+    with open(artifact["path"], "rb") as f:
+        assert f.read() == b"RIFFwav"
+
+
+def test_invalid_ids_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AudioArtifactStore(str(tmp_path)).publish("../etc", b"wav")
+
+
+def test_etag_follows_the_content(tmp_path):
+    store = AudioArtifactStore(str(tmp_path))
+    assert store.publish("aaaaaa", b"one")["etag"] == store.publish("bbbbbb", b"one")["etag"]
+    assert store.publish("cccccc", b"two")["etag"] != store.get("aaaaaa")["etag"]
+
+
+def test_only_latest_answers_replace_the_latest(tmp_path):
+    store = AudioArtifactStore(str(tmp_path))
+    store.publish("aaaaaa", b"desktop")
+    store.publish("bbbbbb", b"session", latest=False)
+    assert store.latest()["id"] == "aaaaaa"
+    assert store.get("bbbbbb") is not None
+
+
+def test_old_artifacts_expire_but_the_latest_stays(tmp_path):
+    store = AudioArtifactStore(str(tmp_path), retention=0)
+    old = store.publish("aaaaaa", b"old")
+    old["created"] -= 10
+    assert store.get("aaaaaa") is not None  # Still the latest
+    store.publish("bbbbbb", b"new")
+    assert store.get("aaaaaa") is None
+    assert not os.path.exists(old["path"])
+
+
+def test_artifact_count_is_capped(tmp_path):
+    store = AudioArtifactStore(str(tmp_path), max_artifacts=2)
+    for response_id in ("aaaaaa", "bbbbbb", "cccccc"):
+        store.publish(response_id, b"wav")
+    assert store.get("aaaaaa") is None
+    assert store.stats()["artifacts"] == 2
+
+
+def test_leftovers_from_a_previous_run_are_removed(tmp_path):
+    (tmp_path / "abcdef.wav").write_bytes(b"old")
+    (tmp_path / "notes.txt").write_bytes(b"keep")
+    AudioArtifactStore(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["notes.txt"]
+
+
+@pytest.fixture(scope="module")
+def voice(tmp_path_factory):
+    for name in ("flask", "flask_cors", "groq", "sarvamai"):
+        pytest.importorskip(name)
+    workdir = tmp_path_factory.mktemp("server")
+    with pytest.MonkeyPatch.context() as patch:
+        # Dummy keys; nothing here calls a provider. Runtime files go to a scratch directory.
+        patch.setenv("GROQ_API_KEY", "test")
+        patch.setenv("SARVAM_API_KEY", "test")
+        patch.setenv("AUDIO_DEFAULT_FORMAT", "wav")
+        patch.setenv("AUDIO_PREENCODE", "")
+        patch.chdir(workdir)
+        module = importlib.import_module("voice")
+        yield module
+    sys.modules.pop("voice", None)
+
+
+def test_response_audio_supports_ranges_and_etags(voice):
+    voice.publish_audio(b"RIFF" + bytes(range(40)), response_id="0123456789ab")
+    client = voice.app.test_client()
+
+    response = client.get("/get-audio/0123456789ab?format=wav")
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    etag = response.headers["ETag"]
+
+    assert client.get("/get-audio/0123456789ab?format=wav", headers={"If-None-Match": etag}).status_code == 304
+
+    partial = client.get("/get-audio/0123456789ab?format=wav", headers={"Range": "bytes=4-7"})
+    assert partial.status_code == 206
+    assert partial.data == bytes(range(4))
+    assert partial.headers["Content-Range"] == "bytes 4-7/44"
+
+
+def test_latest_audio_and_unknown_ids(voice):
+    voice.publish_audio(b"RIFFlatest", response_id="abcdefabcdef")
+    client = voice.app.test_client()
+    assert client.get("/get-audio?format=wav").data == b"RIFFlatest"
+    assert client.get("/get-audio/ffffffffffff").status_code == 404
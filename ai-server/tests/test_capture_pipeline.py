@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+
+from capture_pipeline import UtterancePipeline
+
+
+class Gate:
+    """Handler that records its calls and holds each one until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, pcm, key=None, context=None):
+        with self.lock:
+            self.calls.append((pcm, key, context))
+        self.started.release()
+        self.release.wait(5)
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        UtterancePipeline(lambda pcm: None, policy="shuffle")
+
+
+def test_handler_gets_key_and_context():
+    seen = []
+    pipeline = UtterancePipeline(lambda pcm, key, context=None: seen.append((pcm, key, context))).start()
+    pipeline.submit(b"a", "session", context="shot")
+    pipeline.submit(b"b", "session")
+    pipeline.stop(timeout=5)
+    assert seen == [(b"a", "session", "shot"), (b"b", "session", None)]
+    assert pipeline.metrics()["processed"] == 2
+
+
+def test_failed_handler_is_counted_and_worker_keeps_going():
+    seen = []
+
+    def handler(pcm):
+        if pcm == b"bad":
+            raise RuntimeError("boom")
+        seen.append(pcm)
+
+    pipeline = UtterancePipeline(handler).start()
+    pipeline.submit(b"bad")
+    pipeline.submit(b"good")
+    pipeline.stop(timeout=5)
+    assert seen == [b"good"]
+    assert pipeline.metrics()["failed"] == 1
+
+
+def test_merge_appends_to_pending_utterance_from_same_source():
+    gate = Gate()
+    pipeline = UtterancePipeline(gate, max_pending=1, policy="merge").start()
+    pipeline.submit(b"busy", "a")
+    assert gate.started.acquire(timeout=5)
+    assert pipeline.submit(b"one", "b", context="old")
+    assert pipeline.submit(b"two", "b", context="new")  # Queue full: merged
+    assert not pipeline.submit(b"three", "c")  # Queue full and nothing from c pending: dropped
+    gate.release.set()
+    pipeline.stop(timeout=5)
+    assert gate.calls[1] == (b"onetwo", "b", "new")
+    metrics = pipeline.metrics()
+    assert (metrics["merged"], metrics["dropped"], metrics["processed"]) == (1, 1, 2)
+
+
+def test_drop_oldest_keeps_the_newest_utterances():
+    gate = Gate()
+    pipeline = UtterancePipeline(gate, max_pending=2, policy="drop_oldest").start()
+    pipeline.submit(b"busy")
+    assert gate.started.acquire(timeout=5)
+    assert pipeline.submit(b"1")
+    assert pipeline.submit(b"2")
+    assert not pipeline.submit(b"3")
+    gate.release.set()
+    pipeline.stop(timeout=5)
+    assert [pcm for pcm, _, _ in gate.calls] == [b"busy", b"2", b"3"]
+
+
+def test_drop_newest_keeps_the_queue_as_it_was():
+    gate = Gate()
+    pipeline = UtterancePipeline(gate, max_pending=1, policy="drop_newest").start()
+    pipeline.submit(b"busy")
+    assert gate.started.acquire(timeout=5)
+    assert pipeline.submit(b"1")
+    assert not pipeline.submit(b"2")
+    gate.release.set()
+    pipeline.stop(timeout=5)
+    assert [pcm for pcm, _, _ in gate.calls] == [b"busy", b"1"]
+
+
+def test_block_waits_for_a_slot_then_gives_up():
+    gate = Gate()
+    pipeline = UtterancePipeline(gate, max_pending=1, policy="block", block_timeout=0.1).start()
+    pipeline.submit(b"busy")
+    assert gate.started.acquire(timeout=5)
+    assert pipeline.submit(b"1")
+    started = time.monotonic()
+    assert not pipeline.submit(b"2")
+    assert time.monotonic() - started >= 0.1
+
+    # Once a slot frees up, a blocked submit goes through
+    threading.Timer(0.05, gate.release.set).start()
+    pipeline.block_timeout = 5
+    assert pipeline.submit(b"3")
+    pipeline.stop(timeout=5)
+    assert [pcm for pcm, _, _ in gate.calls] == [b"busy", b"1", b"3"]
+
+
+def test_each_source_is_handled_one_utterance_at_a_time_in_order():
+    lock = threading.Lock()
+    active = set()
+    overlaps = []
+    handled = {}
+
+    def handler(pcm, key):
+        with lock:
+            if key in active:
+                overlaps.append(key)
+            active.add(key)
+        time.sleep(0.01)
+        with lock:
+            active.discard(key)
+            handled.setdefault(key, []).append(pcm)
+
+    pipeline = UtterancePipeline(handler, workers=8, max_pending=64).start()
+    for index in range(6):
+        for key in ("a", "b", "c"):
+            pipeline.submit(index, key)
+    pipeline.stop(timeout=5)
+    assert overlaps == []
+    assert handled == {key: list(range(6)) for key in ("a", "b", "c")}
+
+
+def test_busy_source_does_not_hold_up_other_sources():
+    gate = Gate()
+    pipeline = UtterancePipeline(gate, workers=2).start()
+    pipeline.submit(b"a1", "a")
+    assert gate.started.acquire(timeout=5)
+    pipeline.submit(b"a2", "a")
+    pipeline.submit(b"b1", "b")
+    # The second worker skips a2 (a is busy) and takes b1
+    assert gate.started.acquire(timeout=5)
+    assert [pcm for pcm, _, _ in gate.calls] == [b"a1", b"b1"]
+    gate.release.set()
+    pipeline.stop(timeout=5)
+    assert [pcm for pcm, _, _ in gate.calls] == [b"a1", b"b1", b"a2"]
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def failing():
+    raise RuntimeError("provider down")
+
+
+def test_opens_after_consecutive_failures_and_skips_calls():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(failing)
+    assert breaker.state == "open"
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+    assert breaker.snapshot()["skipped"] == 1
+
+
+def test_falsy_result_counts_as_failure_and_success_resets():
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    assert breaker.call(lambda: None) is None
+    assert breaker.consecutive_failures == 1
+    assert breaker.call(lambda: "text") == "text"
+    assert breaker.consecutive_failures == 0
+    assert breaker.state == "closed"
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", failure_threshold=1, slow_call_ms=1)
+    breaker.call(lambda: time.sleep(0.01) or "late")
+    assert breaker.state == "open"
+    assert breaker.snapshot()["slow_calls"] == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+    assert breaker.allow()  # The probe
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # Everyone else waits for it
+    breaker.record(True, 1)
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_opens_again():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=0)
+    breaker.state, breaker.opened_at = "open", time.time()
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+    assert breaker.state == "open"
+
+
+def test_rate_limited_calls_are_not_failures(status_error):
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    def throttled():
+        raise status_error(429, {"retry-after": "1"})
+
+    for _ in range(5):
+        with pytest.raises(type(status_error(429))):
+            breaker.call(throttled)
+    snapshot = breaker.snapshot()
+    assert snapshot["state"] == "closed"
+    assert (snapshot["failures"], snapshot["throttled"]) == (0, 5)
+
+
+def test_rate_limited_probe_frees_the_probe_slot(status_error):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+
+    def throttled():
+        raise status_error(429)
+
+    with pytest.raises(type(status_error(429))):
+        breaker.call(throttled)
+    assert breaker.state == "half_open"
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
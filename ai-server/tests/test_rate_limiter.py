@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from rate_limiter import (TokenBucketLimiter, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, is_transient_error,
+                          retry_after_seconds)
+
+
+class APIConnectionError(Exception):
+    """Stands in for groq.APIConnectionError, which carries no status"""
+
+
+def sequence(*outcomes):
+    """A provider returning or raising each outcome in turn, counting its calls"""
+    remaining = list(outcomes)
+
+    def call():
+        call.count += 1
+        outcome = remaining.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    call.count = 0
+    return call
+
+
+def limiter(**kwargs):
+    kwargs.setdefault("requests_per_minute", 6000)
+    return TokenBucketLimiter("test", backoff_base=0.001, **kwargs)
+
+
+def test_retry_after_seconds(status_error):
+    assert retry_after_seconds(status_error(429, {"retry-after": "2.5"})) == 2.5
+    assert retry_after_seconds(status_error(429)) == 0
+    assert retry_after_seconds(status_error(500)) is None
+    assert retry_after_seconds(RuntimeError()) is None
+
+
+def test_is_transient_error(status_error):
+    assert all(is_transient_error(status_error(status)) for status in (408, 409, 500, 502, 503))
+    assert not any(is_transient_error(status_error(status)) for status in (400, 401, 404, 429))
+    assert is_transient_error(APIConnectionError("connection reset"))
+    assert is_transient_error(ConnectionResetError())
+    assert not is_transient_error(ValueError())
+
+
+def test_retries_429_until_it_succeeds(status_error):
+    provider = sequence(status_error(429, {"retry-after": "0.01"}), status_error(429), "ok")
+    bucket = limiter(max_retries=3)
+    assert bucket.call(provider) == "ok"
+    assert provider.count == 3
+    stats = bucket.stats()
+    assert (stats["rate_limited"], stats["retries"]) == (2, 2)
+
+
+def test_gives_up_after_max_retries(status_error):
+    provider = sequence(*[status_error(429)] * 3)
+    with pytest.raises(type(status_error(429))):
+        limiter(max_retries=2).call(provider)
+    assert provider.count == 3
+
+
+def test_retries_transient_failures(status_error):
+    provider = sequence(status_error(503), APIConnectionError("reset"), "ok")
+    bucket = limiter(transient_retries=2)
+    assert bucket.call(provider) == "ok"
+    assert bucket.stats()["transient_errors"] == 2
+
+
+def test_transient_retries_are_limited(status_error):
+    provider = sequence(*[status_error(502)] * 3)
+    with pytest.raises(type(status_error(502))):
+        limiter(transient_retries=1).call(provider)
+    assert provider.count == 2
+
+
+def test_other_errors_are_raised_at_once(status_error):
+    provider = sequence(status_error(400))
+    with pytest.raises(type(status_error(400))):
+        limiter().call(provider)
+    assert provider.count == 1
+
+
+def test_rate_limited_burst_does_not_open_the_breaker(status_error):
+    # As in groq_stt: the breaker runs inside the limiter, so it sees every retry
+    breaker = CircuitBreaker("groq_stt", failure_threshold=3)
+    provider = sequence(*[status_error(429)] * 4 + ["text"])
+    assert limiter(max_retries=4).call(breaker.call, provider) == "text"
+    assert provider.count == 5
+    assert breaker.state == "closed"
+
+
+def test_real_failures_inside_the_limiter_still_open_the_breaker(status_error):
+    breaker = CircuitBreaker("groq_stt", failure_threshold=3)
+    provider = sequence(*[status_error(503)] * 3)
+    with pytest.raises(type(status_error(503))):
+        limiter(transient_retries=2).call(breaker.call, provider)
+    assert breaker.state == "open"
+
+
+def test_waits_for_the_request_bucket_to_refill():
+    bucket = TokenBucketLimiter("test", requests_per_minute=600)  # One request per 0.1 s once drained
+    bucket._requests = 0
+    assert bucket.acquire() >= 50
+
+
+def test_token_bucket_limits_large_requests():
+    bucket = TokenBucketLimiter("test", requests_per_minute=6000, tokens_per_minute=6000)
+    bucket.acquire(tokens=6000)
+    assert bucket.acquire(tokens=100) >= 500  # 100 tokens take 1 s to refill
+
+
+def test_interactive_callers_go_before_background_work():
+    bucket = TokenBucketLimiter("test", requests_per_minute=600)
+    bucket._requests = 0
+    order = []
+
+    def caller(name, priority):
+        bucket.acquire(priority=priority)
+        order.append(name)
+
+    background = threading.Thread(target=caller, args=("background", PRIORITY_BACKGROUND))
+    background.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=caller, args=("interactive", PRIORITY_INTERACTIVE))
+    interactive.start()
+    background.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "background"]
@@ -0,0 +1,71 @@
+import time
+
+from stream_sessions import StreamSessionManager
+
+
+class FakeEndpointer:
+    in_speech = False
+    stats = {}
+
+    def feed(self, data):
+        return [data] if data.endswith(b".") else []
+
+    def flush(self):
+        return None
+
+
+def manager(**kwargs):
+    return StreamSessionManager(endpointer_factory=FakeEndpointer, **kwargs)
+
+
+def test_sessions_are_created_once_and_kept_apart():
+    sessions = manager()
+    a = sessions.get_or_create("a")
+    assert sessions.get_or_create("a") is a
+    b = sessions.get_or_create("b")
+    a.conversation.append({"type": "user", "text": "hi"})
+    assert b.conversation == [] and b.endpointer is not a.endpointer
+
+
+def test_feed_counts_audio_and_utterances():
+    session = manager().get_or_create("a")
+    assert session.feed(b"abc") == []
+    assert session.feed(b"done.") == [b"done."]
+    status = session.status()
+    assert (status["bytes_received"], status["utterances"]) == (8, 1)
+
+
+def test_full_registry_refuses_new_sessions():
+    sessions = manager(max_sessions=1)
+    sessions.get_or_create("a")
+    assert sessions.get_or_create("b") is None
+
+
+def test_full_registry_makes_room_by_expiring_idle_sessions():
+    sessions = manager(max_sessions=1, idle_timeout=60, sweep_interval=3600)
+    sessions.get_or_create("a").last_seen -= 120
+    assert sessions.get_or_create("b") is not None
+    assert sessions.get("a") is None
+
+
+def test_idle_sessions_expire_before_the_registry_fills():
+    sessions = manager(idle_timeout=60, sweep_interval=0)
+    sessions.get_or_create("idle").last_seen -= 120
+    sessions.get_or_create("active")
+    assert sessions.get("idle") is None
+    assert len(sessions) == 1
+
+
+def test_sweeps_are_spaced_out():
+    sessions = manager(idle_timeout=60, sweep_interval=3600)
+    sessions.get_or_create("idle").last_seen = time.time() - 120
+    sessions.get_or_create("other")
+    assert sessions.get("idle") is not None
+    assert sessions.expire_idle() == ["idle"]
+
+
+def test_close():
+    sessions = manager()
+    session = sessions.get_or_create("a")
+    assert sessions.close("a") is session
+    assert sessions.get("a") is None
@@ -0,0 +1,90 @@
+import threading
+import time
+
+from audio_buffer import wav_buffer
+from circuit_breaker import CircuitOpenError
+from stt_router import HedgedSTTRouter
+
+
+def audio():
+    return wav_buffer(b"\0" * 3200)
+
+
+def provider(text=None, delay=0.0, error=None):
+    def transcribe(audio):
+        transcribe.calls += 1
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return text
+
+    transcribe.calls = 0
+    return transcribe
+
+
+def test_fast_primary_wins_without_hedging():
+    backup = provider("backup")
+    router = HedgedSTTRouter([("primary", provider("hello")), ("backup", backup)], hedge_delay_ms=500, adaptive=False)
+    assert router.transcribe(audio()) == ("hello", "primary")
+    assert backup.calls == 0
+
+
+def test_slow_primary_is_hedged():
+    router = HedgedSTTRouter([("primary", provider("late", delay=0.5)), ("backup", provider("quick"))],
+                             hedge_delay_ms=50, adaptive=False)
+    assert router.transcribe(audio()) == ("quick", "backup")
+    assert router.histograms["backup"].wins == 1
+
+
+def test_failed_primary_falls_through_straight_away():
+    router = HedgedSTTRouter([("primary", provider(error=RuntimeError("403"))), ("backup", provider("quick"))],
+                             hedge_delay_ms=5000, adaptive=False)
+    started = time.time()
+    assert router.transcribe(audio()) == ("quick", "backup")
+    assert time.time() - started < 1
+    assert router.histograms["primary"].failures == 1
+
+
+def test_empty_transcription_falls_through():
+    router = HedgedSTTRouter([("primary", provider("  ")), ("backup", provider("text"))], adaptive=False)
+    assert router.transcribe(audio()) == ("text", "backup")
+
+
+def test_open_circuit_is_skipped():
+    router = HedgedSTTRouter([("primary", provider(error=CircuitOpenError("open"))), ("backup", provider("text"))],
+                             hedge_delay_ms=5000, adaptive=False)
+    assert router.transcribe(audio()) == ("text", "backup")
+    assert router.histograms["primary"].skipped == 1
+
+
+def test_every_provider_failing():
+    router = HedgedSTTRouter([("primary", provider(None)), ("backup", provider(error=RuntimeError()))], adaptive=False)
+    assert router.transcribe(audio()) == (None, None)
+
+
+def test_each_provider_reads_its_own_copy_of_the_audio():
+    positions = []
+    lock = threading.Lock()
+
+    def reader(delay):
+        def transcribe(audio):
+            time.sleep(delay)
+            with lock:
+                positions.append(len(audio.read()))
+            return None
+        return transcribe
+
+    router = HedgedSTTRouter([("primary", reader(0.1)), ("backup", reader(0))], hedge_delay_ms=20, adaptive=False)
+    router.transcribe(audio())
+    assert positions == [3244, 3244]
+
+
+def test_adaptive_hedge_delay_follows_primary_latency():
+    router = HedgedSTTRouter([("primary", provider("x")), ("backup", provider("y"))], hedge_delay_ms=1500,
+                             min_delay_ms=300, max_delay_ms=5000, min_samples=3)
+    assert router.current_hedge_delay_ms() == 1500  # Not enough samples yet
+    for latency in (400, 500, 600):
+        router.histograms["primary"].record(latency, True)
+    assert 400 <= router.current_hedge_delay_ms() <= 600
+    router.histograms["primary"].record(100000, True)
+    assert router.current_hedge_delay_ms() == 5000
@@ -0,0 +1,51 @@
+import os
+
+from tts_cache import TTSCache, tts_cache_key
+
+
+def test_key_covers_the_voice_and_ignores_spacing():
+    key = tts_cache_key("Hello  there", "anushka", "bulbul:v2", "en-IN")
+    assert key == tts_cache_key("Hello there", "anushka", "bulbul:v2", "en-IN")
+    assert key != tts_cache_key("Hello there", "abhilash", "bulbul:v2", "en-IN")
+
+
+def test_store_then_lookup(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    assert cache.lookup("k") is None
+    path = cache.store("k", b"RIFFwav")
+    assert cache.lookup("k") == path
+    with open(path, "rb") as f:
+        assert f.read() == b"RIFFwav"
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+def test_least_recently_used_audio_is_deleted(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=10)
+    cache.store("a", b"12345")
+    cache.store("b", b"12345")
+    cache.lookup("a")
+    cache.store("c", b"12345")
+    assert cache.lookup("b") is None
+    assert not os.path.exists(cache.path("b"))
+    assert cache.lookup("a") and cache.lookup("c")
+
+
+def test_newest_entry_is_kept_even_over_budget(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=1)
+    cache.store("a", b"12345")
+    assert cache.lookup("a")
+
+
+def test_file_deleted_behind_the_cache_is_a_miss(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    os.remove(cache.store("a", b"wav"))
+    assert cache.lookup("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_reload_keeps_entries_and_drops_unfinished_writes(tmp_path):
+    TTSCache(str(tmp_path)).store("a", b"wav")
+    (tmp_path / "half.tmp").write_bytes(b"x")
+    cache = TTSCache(str(tmp_path))
+    assert cache.lookup("a")
+    assert not (tmp_path / "half.tmp").exists()
@@ -0,0 +1,110 @@
+import collections
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger('origin_logger')
+
+
+def tts_cache_key(text, speaker, model, language):
+    """Content address of a piece of speech: everything that changes the audio"""
+    material = "\0".join((language, model, speaker, " ".join(text.split())))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Synthesized speech on disk, one WAV file per content key, so text
+    that has been spoken before (stock replies, repeated answers) never
+    goes back to the TTS provider.
+
+    Files are written to a temporary name and renamed into place, so a
+    reader never sees a half-written file. Once the files add up to more
+    than max_bytes, the least recently used ones are deleted. Recency
+    survives restarts through the files' modification times.
+    """
+
+    def __init__(self, directory="tts_cache", max_bytes=100 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()  # key -> size, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)  # Left over from a write that never finished
+            elif name.endswith(".wav"):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name[:-len(".wav")], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+        with self._lock:
+            self._evict()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def lookup(self, key):
+        """Path of the cached audio for `key`, or None; a hit makes it most recently used"""
+        with self._lock:
+            if key not in self._entries:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:  # Deleted behind our back
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+                self._stats["hits"] -= 1
+                self._stats["misses"] += 1
+            return None
+        return path
+
+    def store(self, key, wav):
+        """Atomically write `wav` under `key` and return its path"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(wav)
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._total += len(wav) - self._entries.pop(key, 0)
+            self._entries[key] = len(wav)
+            self._stats["stores"] += 1
+            self._evict()
+        return self.path(key)
+
+    def _evict(self):
+        # Never evict the newest entry, even if it alone is over budget
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total -= size
+            self._stats["evicted"] += 1
+            try:
+                os.remove(self.path(key))
+            except OSError as e:
+                logger.warning(f"TTS Cache: could not remove {key}: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), bytes=self._total, max_bytes=self.max_bytes)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
@@ -1,15 +1,36 @@
 # Initialization pyaudio for microphone and Webrtc vad
 
 # pyaudio audio
-import pyaudio
-import webrtcvad
 import numpy as np
-from pydub import AudioSegment
 from io import BytesIO
+from audio_buffer import (wav_buffer, audio_label, transcribe_with, save_debug_audio, join_wavs, split_wav,
+                          streaming_wav_header)
+from audio_sources import MicrophoneSource
+from capture_pipeline import UtterancePipeline
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from provider_clients import ProviderClientRegistry, CapabilityCache, is_capability_error
+from stream_sessions import StreamSessionManager
+from stt_router import HedgedSTTRouter
+from speech_stream import SpeechStream
+from tts_cache import TTSCache, tts_cache_key
+from audio_artifacts import AudioArtifactStore
+from audio_formats import available_formats, negotiate_format, FFMPEG
+from event_stream import EventBroadcaster
+from answer_cache import AnswerCache
+from conversation_context import build_history, history_digest
+from rate_limiter import TokenBucketLimiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from batch_transcribe import LimitedProvider, transcribe_batch
 
 # Image
 import base64
-import pyautogui
+from screen_capture import (prepare_image, ScreenCache, parse_region, active_window_region, crop_to_region,
+                            extract_text, ScreenContextStats, screen_fingerprint, SCREEN_CONTEXT_MODES, estimate_text_tokens,
+                            estimate_image_tokens, pytesseract)
+try:
+    import pyautogui
+except Exception as e:  # No display (e.g. headless CI replaying recordings)
+    print(f"Warning: Screen capture will not be available: {e}")
+    pyautogui = None
 
 # Environment variables
 import os
@@ -21,17 +42,43 @@ import logging
 import datetime
 
 # Flask and CORS
-from flask import Flask, send_file, jsonify, render_template, request
+from flask import Flask, Response, send_file, jsonify, render_template, request
 from flask_cors import CORS
 import threading
 import time
+import json
+import uuid
+import concurrent.futures
+import collections
 
 # Global variables for web audio playback
-latest_audio_path = None
+latest_audio_id = None
 latest_audio_timestamp = 0
 current_conversation = []
+conversation_lock = threading.Lock()
 voice_status = {"listening": False, "processing": False, "speaking": False}
 
+# Browsers subscribed to /events hear about audio, conversation and status changes as they happen
+events = EventBroadcaster(max_subscribers=int(os.environ.get("EVENT_MAX_SUBSCRIBERS", 100)))
+
+def set_voice_status(**changes):
+    """Update voice_status and tell /events subscribers if anything changed"""
+    if any(voice_status.get(key) != value for key, value in changes.items()):
+        voice_status.update(changes)
+        events.publish("voice_status", dict(voice_status))
+
+def set_turn_status(session=None, **changes):
+    """Update the status of a stream session, or of the desktop assistant for turns without one"""
+    if session is None:
+        set_voice_status(**changes)
+    elif any(session.voice_status.get(key) != value for key, value in changes.items()):
+        session.voice_status.update(changes)
+        events.publish("voice_status", dict(session.voice_status), scope=session.session_id)
+
+def event_scope(session):
+    """The /events scope a turn's events go to: the stream session's, or None for the desktop assistant"""
+    return None if session is None else session.session_id
+
 # Setup logging
 def setup_logging():
     # Create logs directory if it doesn't exist
@@ -79,7 +126,6 @@ except Exception as e:
 # For direct Sarvam API access
 import requests
 from sarvamai import SarvamAI
-from sarvamai.play import save
 
 # Check if API keys are set
 groq_api_key = os.environ.get("GROQ_API_KEY")
@@ -118,64 +164,289 @@ if not sarvam_api_key:
 # Groq for LLM and transcription
 from groq import Groq
 
-# Constants for audio capturing
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 16000
-CHUNK_DURATION_MS = 30  # milliseconds
-CHUNK_SIZE = int(RATE * CHUNK_DURATION_MS / 1000)  # samples per chunk
-SILENCE_THRESHOLD = 50  # adjust this threshold according to your environment
-TARGET_DURATION_MS = 700  # Form Sentence after this much silence
+# Constants for audio capturing, shared with the replay benchmark
+from audio_capture import CHANNELS, RATE, CHUNK_SIZE, create_endpointer, run_capture_loop
+
+# Utterances are kept in memory; set DEBUG_SAVE_AUDIO=1 to also write them to disk
+DEBUG_SAVE_AUDIO = os.environ.get("DEBUG_SAVE_AUDIO", "").lower() in ("1", "true", "yes")
+DEBUG_AUDIO_DIR = "debug_audio"
+
+# Captured utterances are queued for a pool of workers so the mic is never starved
+VOICE_WORKERS = int(os.environ.get("VOICE_WORKERS", 1))
+VOICE_QUEUE_SIZE = int(os.environ.get("VOICE_QUEUE_SIZE", 4))
+VOICE_QUEUE_POLICY = os.environ.get("VOICE_QUEUE_POLICY", "merge")  # merge, drop_oldest, drop_newest or block
+
+# Browser streaming sessions, each with its own server-side VAD
+STREAM_MAX_SESSIONS = int(os.environ.get("STREAM_MAX_SESSIONS", 500))
+STREAM_IDLE_TIMEOUT = int(os.environ.get("STREAM_IDLE_TIMEOUT", 300))  # seconds without audio before a session expires
+STREAM_WORKERS = int(os.environ.get("STREAM_WORKERS", 8))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 64))
+STREAM_READ_SIZE = CHUNK_SIZE * 2 * 8  # Read request bodies 8 frames at a time
+
+# Start the Groq whisper fallback if Sarvam hasn't answered within this budget
+STT_HEDGE_DELAY_MS = int(os.environ.get("STT_HEDGE_DELAY_MS", 1500))
+STT_HEDGE_ADAPTIVE = os.environ.get("STT_HEDGE_ADAPTIVE", "1").lower() in ("1", "true", "yes")  # Follow Sarvam's p95 latency
+
+# Screenshots are downscaled and compressed before being sent to the vision model
+SCREENSHOT_MAX_DIMENSION = int(os.environ.get("SCREENSHOT_MAX_DIMENSION", 1568))  # Longest side in pixels, 0 to keep full size
+SCREENSHOT_FORMAT = os.environ.get("SCREENSHOT_FORMAT", "JPEG")  # JPEG, WEBP or PNG
+SCREENSHOT_QUALITY = int(os.environ.get("SCREENSHOT_QUALITY", 80))
+SCREENSHOT_REGION = os.environ.get("SCREENSHOT_REGION", "full")  # full, region (box sent by the frontend) or active_window
+
+# Screen context sent to the LLM: image, ocr, both, or auto (OCR text for text-heavy screens, the image otherwise)
+SCREEN_CONTEXT = os.environ.get("SCREEN_CONTEXT", "image").lower()
+OCR_AUTO_MIN_CHARS = int(os.environ.get("OCR_AUTO_MIN_CHARS", 300))  # In auto mode, screens with at least this much text are sent as text
+OCR_MAX_CHARS = int(os.environ.get("OCR_MAX_CHARS", 4000))
+if SCREEN_CONTEXT not in SCREEN_CONTEXT_MODES:
+    print(f"Warning: Unknown SCREEN_CONTEXT {SCREEN_CONTEXT!r}, sending screenshots as images")
+    SCREEN_CONTEXT = "image"
+elif SCREEN_CONTEXT != "image" and pytesseract is None:
+    print("Warning: pytesseract is not installed, so screen text can't be extracted; sending screenshots as images")
+    SCREEN_CONTEXT = "image"
+
+# Unchanged screens reuse the previous encoding instead of being encoded again
+SCREEN_CACHE_ENABLED = os.environ.get("SCREEN_CACHE", "1").lower() in ("1", "true", "yes")
+# Raising these two reuses screens across a blinking cursor or clock, but may reuse (and answer for) a screen whose text has changed
+SCREEN_CACHE_MAX_DISTANCE = int(os.environ.get("SCREEN_CACHE_MAX_DISTANCE", 0))  # Differing perceptual-hash bits still treated as the same screen
+SCREEN_CACHE_MAX_CHANGED_PIXELS = int(os.environ.get("SCREEN_CACHE_MAX_CHANGED_PIXELS", 0))  # Differing pixels of the 256px-wide thumbnail
+SCREEN_CACHE_DESCRIBE = os.environ.get("SCREEN_CACHE_DESCRIBE", "").lower() in ("1", "true", "yes")  # Send a cached text description of unchanged screens instead of the image
+
+# Stream the LLM answer and speak it sentence by sentence instead of waiting for all of it
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "").lower() in ("1", "true", "yes")
+SPEECH_MIN_SENTENCE_CHARS = int(os.environ.get("SPEECH_MIN_SENTENCE_CHARS", 20))  # Shorter sentences are joined with the next one
+
+# Earlier turns sent back to the LLM: the newest verbatim up to the budget, older questions summarized
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1200))  # 0 sends only the current question
+CONTEXT_SUMMARY_TOKENS = int(os.environ.get("CONTEXT_SUMMARY_TOKENS", 150))
+
+# Answers to recent questions about the same screen are reused instead of calling the LLM again
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE", "1").lower() in ("1", "true", "yes")
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 600))  # seconds
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 256))
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", 0))  # Cosine similarity for a fuzzy question match; 0 matches exact questions only
 
-#webrtc VAD
-def is_silence(chunk):
-    return not vad.is_speech(chunk, RATE)
+# Sarvam voice; any change here gives different audio, so it is part of the TTS cache key
+TTS_LANGUAGE = "en-IN"
+TTS_MODEL = "bulbul:v2"
+TTS_SPEAKER = "anushka"
+TTS_MAX_CHARS = 500  # Sarvam's limit per request; longer sentences are split
+TTS_CONCURRENCY = int(os.environ.get("TTS_CONCURRENCY", 3))  # Sentences synthesized at once
 
-# Initialize PyAudio
-audio = pyaudio.PyAudio()
+# Speech already synthesized is kept on disk and replayed instead of calling Sarvam again
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE", "1").lower() in ("1", "true", "yes")
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = int(os.environ.get("TTS_CACHE_MAX_MB", 100))  # Least recently used audio is deleted beyond this
 
-# Initialize WebRTC VAD
-vad = webrtcvad.Vad()
-vad.set_mode(3)  # Aggressive mode for better voice detection
+# Each spoken response is kept as its own file, served at /get-audio/<response_id>
+AUDIO_ARTIFACT_DIR = os.environ.get("AUDIO_ARTIFACT_DIR", "responses")
+AUDIO_RETENTION = int(os.environ.get("AUDIO_RETENTION", 600))  # Seconds a response's audio stays downloadable
+
+# Compressed delivery of /get-audio (needs ffmpeg): formats offered, the one sent to clients that
+# don't ask for a specific type, and those encoded as soon as an answer is published
+AUDIO_DELIVERY_FORMATS = [name.strip().lower() for name in os.environ.get("AUDIO_FORMATS", "opus,mp3").split(",") if name.strip()]
+AUDIO_DEFAULT_FORMAT = os.environ.get("AUDIO_DEFAULT_FORMAT", "wav").lower()
+AUDIO_PREENCODE = [name.strip().lower() for name in os.environ.get("AUDIO_PREENCODE", "opus").split(",") if name.strip()]
+
+# Process-wide Groq rate limits, per model (Groq limits each model separately); 0 tokens per minute means no token limit
+GROQ_LLM_RPM = int(os.environ.get("GROQ_LLM_RPM", 30))
+GROQ_LLM_TPM = int(os.environ.get("GROQ_LLM_TPM", 30000))
+GROQ_STT_RPM = int(os.environ.get("GROQ_STT_RPM", 20))
+GROQ_MAX_RETRIES = int(os.environ.get("GROQ_MAX_RETRIES", 3))  # Retries after a 429, honouring Retry-After
+GROQ_TRANSIENT_RETRIES = int(os.environ.get("GROQ_TRANSIENT_RETRIES", 2))  # Retries after a 5xx, timeout or dropped connection
+MODEL_CAPABILITY_TTL = int(os.environ.get("MODEL_CAPABILITY_TTL", 3600))  # Seconds to remember that the model refused image input
+
+# Batch transcription - recordings in flight at once, and per-provider call caps
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", 8))
+BATCH_SARVAM_CONCURRENCY = int(os.environ.get("BATCH_SARVAM_CONCURRENCY", 4))
+BATCH_GROQ_CONCURRENCY = int(os.environ.get("BATCH_GROQ_CONCURRENCY", 4))
+
+# webrtc VAD - every audio source gets its own endpointer
+mic_endpointer = create_endpointer()
+
+# What part of the screen to capture; the frontend updates this via /capture-region
+capture_region = {"mode": SCREENSHOT_REGION, "region": None}
+
+def resolve_capture_region(region=None):
+    """
+    The (left, top, width, height) box to capture for this turn: an explicit
+    region, the box last sent by the frontend, or the active window.
+    None means the full screen.
+    """
+    if region is not None:
+        return region
+    if capture_region["mode"] == "region":
+        return capture_region["region"]
+    if capture_region["mode"] == "active_window":
+        return active_window_region()
+    return None
 
 # Enhanced screenshot capture that focuses on iframe content
-def capture_enhanced_screenshot():
+def capture_enhanced_screenshot(region=None):
     """
-    Enhanced screenshot function that captures better quality images
-    and can handle iframe content
+    Enhanced screenshot function that captures the screen, or just the
+    learning iframe / active window when a region is known, downscales it
+    and encodes it compactly for the vision model.
+    Returns a PreparedImage, or None if the screen can't be captured.
     """
+    if pyautogui is None:
+        return None
+    
     try:
-        # Take multiple screenshots to ensure we capture dynamic content
         photo = pyautogui.screenshot()
         
-        # Save as higher quality PNG
-        output = BytesIO()
-        photo.save(output, format='PNG', optimize=False, quality=95)
-        im_data = output.getvalue()
-        image_data = base64.b64encode(im_data).decode("utf-8")
+        region = resolve_capture_region(region)
+        if region:
+            cropped = crop_to_region(photo, region, pyautogui.size())
+            if cropped is None:
+                origin_logger.warning(f"Enhanced Screenshot: region {region} is off screen, capturing the full screen")
+            else:
+                photo = cropped
+        
+        if SCREEN_CACHE_ENABLED:
+            fingerprint, cached = screen_cache.lookup(photo)
+            if cached:
+                origin_logger.info(f"Enhanced Screenshot: screen unchanged, reusing {cached.summary()}")
+                return cached
+        
+        image = prepare_image(photo, max_dimension=SCREENSHOT_MAX_DIMENSION,
+                              image_format=SCREENSHOT_FORMAT, quality=SCREENSHOT_QUALITY)
+        
+        # OCR the full-resolution capture; this runs in the background alongside STT
+        if SCREEN_CONTEXT != "image":
+            ocr_started = time.time()
+            try:
+                image.ocr_text = extract_text(photo, OCR_MAX_CHARS)
+            except Exception as e:
+                origin_logger.warning(f"OCR Error: {e}")
+            image.ocr_ms = round((time.time() - ocr_started) * 1000)
+            origin_logger.info(f"OCR: {len(image.ocr_text or '')} characters "
+                               f"(~{estimate_text_tokens(image.ocr_text)} tokens vs ~{image.tokens} for the image) in {image.ocr_ms}ms")
         
-        # Log screenshot capture with enhanced info
-        origin_logger.info(f"Enhanced Screenshot: Captured {len(im_data)} bytes of screen data")
+        # Encode now, off the critical path, only if the image is going to be sent
+        if choose_screen_mode(image) in ("image", "both"):
+            image.data_url
         
-        return image_data
+        # Log screenshot capture with the size, byte and token savings
+        origin_logger.info(f"Enhanced Screenshot: {image.summary()}")
+        
+        if SCREEN_CACHE_ENABLED:
+            screen_cache.store(fingerprint, image)
+            if SCREEN_CACHE_DESCRIBE:
+                threading.Thread(target=describe_screen, args=(image,), daemon=True).start()
+        else:
+            image.screen_hash = screen_fingerprint(photo)["key"]  # Still keys the answer cache
+        
+        return image
     except Exception as e:
         origin_logger.error(f"Screenshot Error: {e}")
         return None
 
+screen_cache = ScreenCache(max_distance=SCREEN_CACHE_MAX_DISTANCE, max_changed_pixels=SCREEN_CACHE_MAX_CHANGED_PIXELS)
+screen_context_stats = ScreenContextStats()
+answer_cache = AnswerCache(ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_SIZE,
+                           similarity=ANSWER_CACHE_SIMILARITY)
+
+def ocr_context(image):
+    return {"type": "text", "text": f"Text on the student's screen:\n{image.ocr_text}"}
+
+def choose_screen_mode(image):
+    """
+    "image", "ocr", "both" or "none": how SCREEN_CONTEXT applies to this
+    screenshot, given what OCR read and whether the model accepts images
+    """
+    mode = SCREEN_CONTEXT
+    if mode == "auto":
+        mode = "ocr" if image.ocr_text and len(image.ocr_text) >= OCR_AUTO_MIN_CHARS else "image"
+    elif mode in ("ocr", "both") and not image.ocr_text:
+        mode = "image"  # Nothing readable on screen
+    
+    if mode in ("image", "both") and not model_capabilities.supports(MODEL, "image"):
+        mode = "ocr" if image.ocr_text else "none"  # Known to fail; don't send it just to fall back
+    return mode
+
+def screen_context(image):
+    """
+    Decide how this turn's screen is shown to the LLM.
+    Returns (mode, content parts, estimated screen tokens).
+    """
+    if not image:
+        return "none", [], 0
+    
+    # A cached description of an unchanged screen replaces the image entirely
+    description = screen_cache.description_for(image) if SCREEN_CACHE_DESCRIBE else None
+    if description:
+        return "description", [{
+            "type": "text",
+            "text": f"The student's screen (unchanged since their last question): {description}"
+        }], estimate_text_tokens(description)
+    
+    mode = choose_screen_mode(image)
+    if mode == "none":
+        return mode, [], 0
+    
+    parts, tokens = [], 0
+    if mode in ("ocr", "both"):
+        parts.append(ocr_context(image))
+        tokens += estimate_text_tokens(image.ocr_text)
+    if mode in ("image", "both"):
+        encoded_now = not image.encoded
+        parts.append({"type": "image_url", "image_url": {"url": image.data_url}})
+        tokens += image.tokens
+        if encoded_now:  # Captured when it wasn't going to be sent, e.g. while the model refused images
+            origin_logger.info(f"Enhanced Screenshot: encoded to send, {image.summary()}")
+    return mode, parts, tokens
+
+# Screenshots are taken in the background while speech-to-text runs
+screen_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="screen")
+
+def prefetch_screenshot():
+    """
+    Start capturing the screen the moment an utterance is endpointed, so the
+    screenshot shows what the student saw while speaking. The returned
+    future is queued along with that utterance.
+    """
+    return screen_executor.submit(capture_enhanced_screenshot)
+
+# Provider clients are created once and share one keep-alive connection pool
+provider_clients = ProviderClientRegistry()
+
+# Circuit breakers skip a provider after repeated failures or slow calls, then probe it again
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 3))
+BREAKER_SLOW_CALL_MS = int(os.environ.get("BREAKER_SLOW_CALL_MS", 8000))
+BREAKER_RESET_SECONDS = int(os.environ.get("BREAKER_RESET_SECONDS", 30))
+
+provider_breakers = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        slow_call_ms=BREAKER_SLOW_CALL_MS,
+        reset_timeout=BREAKER_RESET_SECONDS
+    )
+    for name in ("sarvam_stt", "sarvam_tts", "groq_stt")
+}
+
+def sarvam_client():
+    return provider_clients.get("sarvam", lambda http_client: SarvamAI(
+        api_subscription_key=sarvam_api_key,
+        httpx_client=http_client,
+    ))
+
 # Sarvam API functions
-def sarvam_stt(audio_file_path):
+def sarvam_stt(audio):
     """
-    Transcribe audio using Sarvam's Speech-to-Text API via SarvamAI library
+    Transcribe audio using Sarvam's Speech-to-Text API via SarvamAI library.
+    Accepts a WAV file path or an in-memory WAV buffer. Errors are logged and
+    raised, so the STT router can move on and batch results show the cause.
     """
     try:
-        # Initialize SarvamAI client
-        client = SarvamAI(api_subscription_key=sarvam_api_key)
+        # Shared SarvamAI client on the pooled keep-alive connections
+        client = sarvam_client()
         
         # Transcribe audio using SarvamAI library
-        response = client.speech_to_text.translate(
-            file=open(audio_file_path, "rb"),
+        response = provider_breakers["sarvam_stt"].call(transcribe_with, audio, lambda audio_file: client.speech_to_text.translate(
+            file=audio_file,
             model="saaras:v2.5",  
-        )
+        ))
         
         print("Sarvam STT successful")
         # Extract text from response
@@ -189,83 +460,226 @@ def sarvam_stt(audio_file_path):
             
         # Log the transcription and its origin
         input_logger.info(f"Transcription: {text_result}")
-        origin_logger.info(f"STT: Sarvam processed audio file {audio_file_path} to text")
+        origin_logger.info(f"STT: Sarvam processed {audio_label(audio)} to text")
         
         return text_result
+    except CircuitOpenError:
+        raise  # Let the STT router move straight on to the next provider
     except Exception as e:
         print(f"Sarvam STT error: {e}")
-        origin_logger.error(f"STT Error: Sarvam failed to process {audio_file_path}: {e}")
-        return None
+        origin_logger.error(f"STT Error: Sarvam failed to process {audio_label(audio)}: {e}")
+        raise
 
-def sarvam_tts(text):
+def sarvam_synthesize(text):
     """
-    Convert text to speech using Sarvam's Text-to-Speech API via SarvamAI library
+    Convert text to speech with Sarvam and return the WAV bytes
     """
-    global latest_audio_path, latest_audio_timestamp
+    # Shared SarvamAI client on the pooled keep-alive connections
+    client = sarvam_client()
     
-    try:
-        text = text.strip()
-        if not text or len(text) > 500:  # Limit text length to avoid API errors
-            print("Warning: Empty or too long text passed to TTS.")
-            if text and len(text) > 500:
-                text = text[:500] + "..."  # Truncate text if too long
-            else:
-                return False
-        
-        # Initialize SarvamAI client
-        client = SarvamAI(api_subscription_key=sarvam_api_key)
-        
-        # Convert text to speech
-        audio_response = client.text_to_speech.convert(
-            target_language_code="en-IN",  
-            text=text,
-            model="bulbul:v2",
-            speaker="anushka"
-        )
-        
-        # Save the audio to a file
-        output_path = "response.wav"
-        save(audio_response, output_path)
-        
-        # Update global variables for web access
-        latest_audio_path = os.path.abspath(output_path)
-        latest_audio_timestamp = time.time()
-        
-        print(f"Sarvam TTS successful - saved audio to {output_path}")
-        
-        # Log the TTS generation
-        output_logger.info(f"TTS Output: '{text}' converted to speech")
-        origin_logger.info(f"TTS: Sarvam converted text to speech: '{text}'")
-        
-        return True
-    except Exception as e:
-        print(f"Sarvam TTS error: {e}")
-        origin_logger.error(f"TTS Error: Sarvam failed to convert text to speech: {e}")
-        return False
+    # Convert text to speech
+    audio_response = provider_breakers["sarvam_tts"].call(
+        client.text_to_speech.convert,
+        target_language_code=TTS_LANGUAGE,
+        text=text,
+        model=TTS_MODEL,
+        speaker=TTS_SPEAKER
+    )
+    
+    # Long texts come back as several WAV chunks
+    audios = audio_response.audios if isinstance(audio_response.audios, list) else [audio_response.audios]
+    return join_wavs(base64.b64decode(audio) for audio in audios)
 
-def speak_response(text):
+tts_cache = TTSCache(TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024) if TTS_CACHE_ENABLED else None
+
+def synthesize_speech(text):
     """
-    Generate speech response using Sarvam TTS
+    Speech for `text` as wav bytes. Text spoken before with the same voice
+    comes from the TTS cache without calling Sarvam.
     """
-    global voice_status
+    if tts_cache is None:
+        return sarvam_synthesize(text)
+    
+    key = tts_cache_key(text, TTS_SPEAKER, TTS_MODEL, TTS_LANGUAGE)
+    path = tts_cache.lookup(key)
+    if path:
+        try:
+            with open(path, "rb") as f:
+                wav = f.read()
+            origin_logger.info(f"TTS: served '{text[:60]}' from the TTS cache")
+            return wav
+        except OSError as e:
+            origin_logger.warning(f"TTS Cache: could not read {path}: {e}")
+    
+    wav = sarvam_synthesize(text)
+    if wav:
+        try:
+            tts_cache.store(key, wav)
+        except OSError as e:
+            origin_logger.warning(f"TTS Cache: could not store audio: {e}")
+    return wav
+
+delivery_formats = available_formats(AUDIO_DELIVERY_FORMATS)
+if not FFMPEG and set(AUDIO_DELIVERY_FORMATS) - {"wav"}:
+    print("Warning: ffmpeg not found; audio will be served as WAV only")
+audio_artifacts = AudioArtifactStore(AUDIO_ARTIFACT_DIR, retention=AUDIO_RETENTION,
+                                     preencode=[name for name in AUDIO_PREENCODE if name in delivery_formats and name != "wav"])
+
+def publish_audio(wav, response_id=None, session=None):
+    """
+    Make a finished answer's audio available at /get-audio/<response_id>
+    (and, for the desktop assistant, at /get-audio as the latest answer).
+    """
+    global latest_audio_id, latest_audio_timestamp
     
-    voice_status["speaking"] = True
+    response_id = response_id or uuid.uuid4().hex[:12]
+    artifact = audio_artifacts.publish(response_id, wav, latest=session is None)
+    if session is not None:
+        # A stream session's answer; only its own subscribers hear about it
+        events.publish("audio", {"audio_id": response_id, "audio_url": f"/get-audio/{response_id}",
+                                 "timestamp": time.time()}, scope=session.session_id)
+        return artifact["path"]
     
-    if sarvam_tts(text):
-        print("TTS generation successful")
-        # Audio is saved and will be accessible via web endpoint
+    # Update global variables for web access
+    latest_audio_id = response_id
+    latest_audio_timestamp = time.time()
+    events.publish("audio", {"audio_id": response_id, "audio_url": f"/get-audio/{response_id}",
+                             "timestamp": latest_audio_timestamp})
+    return artifact["path"]
+
+def speak_response(text, response_id=None, started=None, session=None):
+    """
+    Speak a complete answer. It is split into sentences that are
+    synthesized in parallel (up to TTS_CONCURRENCY Sarvam calls at once)
+    and played in order as each becomes ready, so a long answer is spoken
+    in full and starts as soon as a short one would. Returns the
+    SpeechStream; synthesis carries on in the background.
+    """
+    speech = start_speech_stream(started, response_id, session)
+    speech.feed(text)
+    speech.finish()
+    origin_logger.info(f"TTS: speaking {len(text)} characters in {len(speech.segments)} segments")
+    return speech
+
+# Every Sarvam TTS call runs here, so parallel sentences never exceed the provider's concurrency
+tts_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TTS_CONCURRENCY, thread_name_prefix="tts")
+
+# Recent sentence-by-sentence answers, newest last, so browsers can fetch their segments
+speech_streams = collections.OrderedDict()
+speech_streams_lock = threading.Lock()
+MAX_SPEECH_STREAMS = 8
+latest_streamed_response = {"response_id": None}
+latest_speech = {"response_id": None}  # The desktop assistant's newest answer; stream sessions' are looked up by ID
+
+def start_speech_stream(started=None, response_id=None, session=None):
+    """
+    Start speaking an answer, which may still be being generated. An
+    answer for a stream session is only reachable by its response ID.
+    """
+    set_turn_status(session, speaking=True)
+    speech = SpeechStream(synthesize_speech, min_chars=SPEECH_MIN_SENTENCE_CHARS,
+                          started=started, on_done=lambda speech: finish_speech_stream(speech, session),
+                          executor=tts_executor, max_chars=TTS_MAX_CHARS, response_id=response_id)
+    with speech_streams_lock:
+        speech_streams[speech.response_id] = speech
+        while len(speech_streams) > MAX_SPEECH_STREAMS:
+            speech_streams.popitem(last=False)
+        if session is None:
+            latest_speech["response_id"] = speech.response_id
+    events.publish("speech", {"response_id": speech.response_id}, scope=event_scope(session))
+    return speech
+
+def finish_speech_stream(speech, session=None):
+    """
+    Once every sentence is synthesized, publish the whole answer at
+    /get-audio/<response_id> (and, for the desktop assistant, /get-audio)
+    for clients that don't play segments
+    """
+    wav = speech.wav()
+    if wav:
+        if session is None:
+            latest_streamed_response["response_id"] = speech.response_id
+        publish_audio(wav, response_id=speech.response_id, session=session)
+        output_logger.info(f"TTS Output: '{speech.text}' converted to speech in {len(speech.segments)} segments")
     else:
-        print("TTS failed; no audio generated.")
         origin_logger.error("TTS failed; no audio generated")
-    
-    voice_status["speaking"] = False
+    set_turn_status(session, speaking=False)
 
 #Initialize Groq client
 MODEL="meta-llama/llama-4-scout-17b-16e-instruct"  # Using Llama 4 Scout model from Groq
-client = Groq(
+client = provider_clients.get("groq", lambda http_client: Groq(
     api_key=groq_api_key,
+    http_client=http_client,
+    max_retries=0,  # 429s, 5xx and dropped connections are retried by the rate limiter instead
+))
+
+# Features the model turned down, so later turns don't request them only to fail
+model_capabilities = CapabilityCache(ttl=MODEL_CAPABILITY_TTL)
+
+# Every Groq call waits its turn here; voice turns go ahead of background work
+groq_limiters = {
+    "llm": TokenBucketLimiter(MODEL, requests_per_minute=GROQ_LLM_RPM, tokens_per_minute=GROQ_LLM_TPM or None,
+                              max_retries=GROQ_MAX_RETRIES, transient_retries=GROQ_TRANSIENT_RETRIES),
+    "stt": TokenBucketLimiter("whisper-large-v3-turbo", requests_per_minute=GROQ_STT_RPM,
+                              max_retries=GROQ_MAX_RETRIES, transient_retries=GROQ_TRANSIENT_RETRIES),
+}
+
+# Upper bound used to reserve tokens for a screenshot before Groq reports the real count
+IMAGE_TOKENS_ESTIMATE = estimate_image_tokens(SCREENSHOT_MAX_DIMENSION or 1568, SCREENSHOT_MAX_DIMENSION or 1568)
+
+def estimate_request_tokens(messages, max_tokens):
+    tokens = max_tokens
+    for message in messages:
+        content = message["content"]
+        for part in content if isinstance(content, list) else [{"type": "text", "text": content}]:
+            tokens += estimate_text_tokens(part["text"]) if part["type"] == "text" else IMAGE_TOKENS_ESTIMATE
+    return tokens
+
+def groq_chat(messages, max_tokens, priority=PRIORITY_INTERACTIVE, **kwargs):
+    """
+    Chat completion through the Groq rate limiter. Returns (response, estimated tokens)
+    """
+    tokens = estimate_request_tokens(messages, max_tokens)
+    response = groq_limiters["llm"].call(
+        client.chat.completions.create,
+        tokens=tokens,
+        priority=priority,
+        messages=messages,
+        model=MODEL,
+        max_tokens=max_tokens,
+        **kwargs
+    )
+    return response, tokens
+
+def groq_stt(audio, priority=PRIORITY_INTERACTIVE):
+    """
+    Transcribe audio with Groq's hosted Whisper model
+    """
+    transcription = groq_limiters["stt"].call(
+        provider_breakers["groq_stt"].call, transcribe_with, audio, lambda audio_file: client.audio.transcriptions.create(
+            model="whisper-large-v3-turbo", 
+            file=audio_file, 
+            response_format="text"
+        ),
+        priority=priority
+    )
+    # Log Groq transcription
+    input_logger.info(f"Transcription: {transcription}")
+    origin_logger.info(f"STT: Groq processed {audio_label(audio)} to text")
+    return transcription
+
+# Sarvam first, with Groq hedged in once Sarvam is slower than the budget
+stt_router = HedgedSTTRouter(
+    [("sarvam", sarvam_stt), ("groq", groq_stt)] if sarvam_api_key else [("groq", groq_stt)],
+    hedge_delay_ms=STT_HEDGE_DELAY_MS,
+    adaptive=STT_HEDGE_ADAPTIVE
 )
 
+# Batch jobs don't hedge: Groq is only tried for recordings Sarvam couldn't transcribe
+batch_providers = [LimitedProvider("groq", lambda audio: groq_stt(audio, PRIORITY_BACKGROUND), BATCH_GROQ_CONCURRENCY)]
+if sarvam_api_key:
+    batch_providers.insert(0, LimitedProvider("sarvam", sarvam_stt, BATCH_SARVAM_CONCURRENCY))
+
 # Enhanced prompts for better educational assistance
 promptTeach = """You are an advanced educational AI assistant specialized in helping students learn through interactive voice conversations. You can see what's on the student's screen (including videos, documents, websites, and apps) and provide contextual help.
 
@@ -297,123 +711,272 @@ Analyze what's visible on the screen and help the user with their query. Focus o
 
 Keep responses concise (15-30 words) for voice interaction. Be direct and helpful."""
 
-# Process voice input with enhanced screen analysis
-def process_voice_input(audio_file_path):
+promptDescribe = """Describe what is on this screen for someone who cannot see it: the app or website, any visible headings, text, code, equations or diagrams, and what the user appears to be working on. Be factual and specific, in at most 120 words."""
+
+def describe_screen(image):
+    """
+    Ask the vision model for a text description of a screenshot, so later
+    questions about the same screen can send the text instead of the image
+    """
+    if not model_capabilities.supports(MODEL, "image"):
+        return
+    try:
+        chat_completion, _ = groq_chat(
+            [{"role": "user", "content": [
+                {"type": "text", "text": promptDescribe},
+                {"type": "image_url", "image_url": {"url": image.data_url}}
+            ]}],
+            max_tokens=200,
+            priority=PRIORITY_BACKGROUND,
+            temperature=0.0,
+        )
+        image.description = chat_completion.choices[0].message.content.strip()
+        origin_logger.info(f"Screen Description: cached {len(image.description)} characters")
+    except Exception as e:
+        if is_capability_error(e):
+            model_capabilities.mark_unsupported(MODEL, "image", e)
+        origin_logger.warning(f"Screen Description Error: {e}")
+
+def ask_llm(messages, speech=None):
     """
-    Process voice input with enhanced screen analysis for educational content
+    Run a chat completion and return (answer, usage). Given a SpeechStream,
+    the completion is streamed and each sentence is spoken as it arrives.
     """
-    global current_conversation, voice_status
+    if speech is None:
+        chat_completion, estimated = groq_chat(
+            messages,
+            max_tokens=150,  # Limit for concise responses
+            temperature=0.1,
+        )
+        usage = getattr(chat_completion, "usage", None)
+        groq_limiters["llm"].settle(estimated, getattr(usage, "total_tokens", None))
+        return chat_completion.choices[0].message.content.strip(), usage
     
-    voice_status["processing"] = True
+    parts, usage = [], None
+    stream, estimated = groq_chat(messages, max_tokens=150, temperature=0.1, stream=True)
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                speech.feed(chunk.choices[0].delta.content)
+            # Groq reports usage on the last chunk
+            x_groq = getattr(chunk, "x_groq", None)
+            if getattr(x_groq, "usage", None):
+                usage = x_groq.usage
+    except Exception as e:
+        if not parts:
+            raise  # Nothing spoken yet, so the caller can still fall back
+        origin_logger.warning(f"LLM Error: Stream broke off after {len(parts)} chunks, keeping the partial answer: {e}")
+    groq_limiters["llm"].settle(estimated, getattr(usage, "total_tokens", None))
+    return "".join(parts).strip(), usage
+
+def generate_answer(messages, transcription, image, context_mode, screen_tokens, speech=None, history=()):
+    """
+    Ask Groq, falling back to a text-only request if the one with the
+    screen fails. Returns (answer, usage, context_mode, screen_tokens),
+    where the last two describe the request that produced the answer.
+    """
+    try:
+        # Try with image input first (if available)
+        answer, usage = ask_llm(messages, speech)
+        origin_logger.info(f"LLM: Groq processed text+{context_mode} query with model {MODEL}")
+    except Exception as e:
+        print(f"Enhanced input failed, falling back to text-only: {e}")
+        origin_logger.warning(f"LLM Error: Enhanced input failed, falling back to text-only: {e}")
+        if context_mode in ("image", "both") and is_capability_error(e):
+            # Later turns go straight to text until the capability TTL runs out
+            model_capabilities.mark_unsupported(MODEL, "image", e)
+            origin_logger.warning(f"LLM: {MODEL} refused image input; sending text only for {MODEL_CAPABILITY_TTL}s")
+        # Fall back to text-only if image input fails, keeping the screen text if OCR read any
+        fallback_content = transcription
+        context_mode, screen_tokens = "none", 0
+        if image and image.ocr_text:
+            fallback_content = [{"type": "text", "text": transcription}, ocr_context(image)]
+            context_mode, screen_tokens = "ocr", estimate_text_tokens(image.ocr_text)
+        answer, usage = ask_llm([{"role": "system", "content": promptHelp}] + list(history) + [
+            {"role": "user", "content": fallback_content}
+        ], speech)
+        origin_logger.info(f"LLM: Groq processed text-only query with model {MODEL}")
+    return answer, usage, context_mode, screen_tokens
+
+# Process voice input with enhanced screen analysis
+def process_voice_input(audio, region=None, use_cache=True, session=None, screenshot=None):
+    """
+    Process voice input with enhanced screen analysis for educational content.
+    `audio` is an in-memory WAV buffer or, for debugging, a WAV file path.
+    `region` optionally limits the screenshot to a (left, top, width, height) box.
+    `use_cache=False` always asks the LLM, even if the answer cache has a match.
+    `session` is the StreamSession a browser-streamed turn belongs to: it
+    keeps its own conversation and status, its answer isn't published as
+    the latest audio, and the server's screen (which the remote learner
+    isn't looking at) is not captured.
+    `screenshot` is a future for this utterance's screenshot, started when
+    it was endpointed; without one the screen is captured now.
+    """
+    set_turn_status(session, processing=True)
+    timings = {}
+    started = time.time()
+    speech = None
     
     try:
-        # Transcription - Try Sarvam STT first, fall back to Groq
-        transcription = None
-        if sarvam_api_key:
-            transcription = sarvam_stt(audio_file_path)
-        
-        # Fall back to Groq if Sarvam failed or is not available
-        if not transcription:
-            with open(audio_file_path, "rb") as audio_file:
-                transcription = client.audio.transcriptions.create(
-                    model="whisper-large-v3-turbo", 
-                    file=audio_file, 
-                    response_format="text"
-                )
-            # Log Groq transcription
-            input_logger.info(f"Transcription: {transcription}")
-            origin_logger.info(f"STT: Groq processed audio file {audio_file_path} to text")
+        # Screen capture runs alongside transcription instead of after it
+        if session is not None:
+            screenshot = None
+        elif screenshot is None:
+            screenshot = screen_executor.submit(capture_enhanced_screenshot, region)
+        
+        # Transcription - Sarvam STT first, with Groq hedged in if Sarvam is slow or fails
+        transcription, stt_provider = stt_router.transcribe(audio)
+        timings["stt_ms"] = round((time.time() - started) * 1000)
+        timings["stt_provider"] = stt_provider
         
         if not transcription or transcription.strip() == "":
+            set_turn_status(session, processing=False)
             return None
             
         print(f"Question: {transcription}")
         
-        # Enhanced screenshot capture
-        image_data = capture_enhanced_screenshot()
-        if not image_data:
+        # Enhanced screenshot capture - only the time spent waiting on it after STT is on the critical path
+        stage_started = time.time()
+        image = screenshot.result() if screenshot else None
+        if screenshot and not image:
             print("Failed to capture screenshot, proceeding with text-only")
+        timings["screenshot_ms"] = round((time.time() - stage_started) * 1000)
+        
+        # Earlier turns of the conversation, text only and within the token budget
+        turns = current_conversation if session is None else session.conversation
+        with conversation_lock:
+            conversation = list(turns)
+        history, history_stats = build_history(conversation, CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARY_TOKENS)
+        timings.update(history_stats)
         
-        # Create messages with text and image
-        messages = [
-            {"role": "system", "content": promptTeach},
+        # Create messages with text and image; only the newest turn carries the screen
+        messages = [{"role": "system", "content": promptTeach}] + history + [
             {"role": "user", "content": [
                 {"type": "text", "text": transcription}
             ]}
         ]
         
-        # Add image if available
-        if image_data:
-            messages[1]["content"].append({
-                "type": "image_url", 
-                "image_url": {
-                    "url": f"data:image/png;base64,{image_data}"
-                }
-            })
+        # Add the screen as an image, OCR text or both, depending on SCREEN_CONTEXT
+        context_mode, context_parts, screen_tokens = screen_context(image)
+        messages[-1]["content"].extend(context_parts)
         
-        try:
-            # Try with image input first (if available)
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model=MODEL,
-                temperature=0.1,
-                max_tokens=150,  # Limit for concise responses
-            )
-            origin_logger.info(f"LLM: Groq processed {'text+image' if image_data else 'text-only'} query with model {MODEL}")
-        except Exception as e:
-            print(f"Enhanced input failed, falling back to text-only: {e}")
-            origin_logger.warning(f"LLM Error: Enhanced input failed, falling back to text-only: {e}")
-            # Fall back to text-only if image input fails
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": promptHelp},
-                    {"role": "user", "content": transcription}
-                ],
-                model=MODEL,
-                temperature=0.1,
-                max_tokens=150,
-            )
-            origin_logger.info(f"LLM: Groq processed text-only query with model {MODEL}")
+        # Answer from the cache if this question was asked about the same screen, after the same turns, recently
+        screen_hash = image.screen_hash if image else None
+        context_key = history_digest(history)
+        cached = answer_cache.lookup(transcription, screen_hash, context_key) if ANSWER_CACHE_ENABLED and use_cache else None
         
-        answer = chat_completion.choices[0].message.content.strip()
+        stage_started = time.time()
+        if cached:
+            answer = cached["answer"]
+            timings["answer_cache"] = cached["match"]
+            origin_logger.info(f"LLM: Answered from cache ({cached['match']} match for '{cached['question']}'), saving ~{cached['llm_ms']}ms")
+        else:
+            if LLM_STREAMING and sarvam_api_key:
+                speech = start_speech_stream(started, session=session)
+            answer, usage, context_mode, screen_tokens = generate_answer(
+                messages, transcription, image, context_mode, screen_tokens, speech, history)
+            if speech is not None:
+                speech.finish()
+            timings["answer_cache"] = "miss" if ANSWER_CACHE_ENABLED and use_cache else "bypass"
+        
+        timings["llm_ms"] = round((time.time() - stage_started) * 1000)
+        timings["screen_context"] = context_mode
+        if not cached:
+            screen_context_stats.record(context_mode, screen_tokens, timings["llm_ms"],
+                                        prompt_tokens=getattr(usage, "prompt_tokens", None),
+                                        ocr_ms=image.ocr_ms if image else None)
+            if ANSWER_CACHE_ENABLED and answer:
+                answer_cache.store(transcription, screen_hash, answer, timings["llm_ms"], context_key)
         print(f"AI Response: {answer}")
         
         # Add to conversation history
-        current_conversation.append({
-            "type": "user",
-            "text": transcription,
-            "timestamp": time.time()
-        })
-        current_conversation.append({
-            "type": "ai", 
-            "text": answer,
-            "timestamp": time.time()
-        })
-        
-        # Keep only last 10 exchanges
-        if len(current_conversation) > 20:
-            current_conversation = current_conversation[-20:]
+        with conversation_lock:
+            turns.append({
+                "type": "user",
+                "text": transcription,
+                "timestamp": time.time()
+            })
+            turns.append({
+                "type": "ai", 
+                "text": answer,
+                "timestamp": time.time()
+            })
+            
+            # Keep only last 10 exchanges
+            del turns[:-20]
+            conversation = list(turns)
+        events.publish("conversation", {"conversation": conversation}, scope=event_scope(session))
         
         # Log the LLM response
         output_logger.info(f"LLM Response: {answer}")
         
-        # Generate speech response
-        if sarvam_api_key:
-            threading.Thread(target=speak_response, args=(answer,), daemon=True).start()
+        # Generate speech response (already under way when streaming)
+        if sarvam_api_key and speech is None:
+            speech = speak_response(answer, started=started, session=session)
+        response_id = speech.response_id if speech else uuid.uuid4().hex[:12]
+        
+        timings["total_ms"] = round((time.time() - started) * 1000)
+        origin_logger.info(f"Timing: {timings}")
         
-        voice_status["processing"] = False
+        set_turn_status(session, processing=False)
         return {
             "transcription": transcription,
             "response": answer,
-            "timestamp": time.time()
+            "response_id": response_id,
+            "timestamp": time.time(),
+            "timings": timings
         }
         
     except Exception as e:
         print(f"Error processing voice input: {e}")
         origin_logger.error(f"Voice Processing Error: {e}")
-        voice_status["processing"] = False
+        if speech is not None:
+            speech.finish()
+        set_turn_status(session, processing=False)
         return None
 
+def process_captured_utterance(pcm, session=None, context=None):
+    """
+    Pipeline worker: wrap a captured utterance in an in-memory WAV and
+    answer it, with the screenshot future queued alongside it as `context`
+    """
+    captured_audio = wav_buffer(pcm, rate=RATE)
+    if DEBUG_SAVE_AUDIO:
+        save_debug_audio(captured_audio, DEBUG_AUDIO_DIR)
+    return process_voice_input(captured_audio, session=session, screenshot=context)
+
+utterance_pipeline = UtterancePipeline(
+    process_captured_utterance,
+    workers=VOICE_WORKERS,
+    max_pending=VOICE_QUEUE_SIZE,
+    policy=VOICE_QUEUE_POLICY
+)
+
+stream_sessions = StreamSessionManager(
+    endpointer_factory=create_endpointer,
+    max_sessions=STREAM_MAX_SESSIONS,
+    idle_timeout=STREAM_IDLE_TIMEOUT
+)
+
+def process_stream_utterance(pcm, session):
+    """
+    Pipeline worker for browser sessions: answer the utterance within the
+    session and keep the result there so the browser can fetch it
+    """
+    result = process_captured_utterance(pcm, session)
+    if result:
+        session.results.append(result)
+    return result
+
+stream_pipeline = UtterancePipeline(
+    process_stream_utterance,
+    workers=STREAM_WORKERS,
+    max_pending=STREAM_QUEUE_SIZE,
+    policy=VOICE_QUEUE_POLICY,
+    name="stream"
+).start()
+
 # Start Flask web server for audio playback and API
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -476,19 +1039,47 @@ def index():
             let lastTimestamp = 0;
             let isListening = false;
             
-            // Check for new audio every 1 second
-            setInterval(checkForNewAudio, 1000);
-            setInterval(updateConversation, 2000);
+            let lastSpeechId = null;
+            
+            // Finished answers are fetched compressed; the server sends WAV if it can't encode
+            const audioFormat = new Audio().canPlayType('audio/ogg; codecs=opus') ? 'opus' : 'mp3';
+            
+            // Updates are pushed over /events; browsers without EventSource poll instead
+            if (window.EventSource) {
+                const events = new EventSource('/events');
+                events.addEventListener('speech', e => {
+                    lastSpeechId = JSON.parse(e.data).response_id;
+                    playStream(lastSpeechId);
+                });
+                events.addEventListener('audio', e => playAudio(JSON.parse(e.data)));
+                events.addEventListener('conversation', e => renderConversation(JSON.parse(e.data).conversation));
+                events.addEventListener('voice_status', e => {
+                    const status = JSON.parse(e.data);
+                    if (status.processing) document.getElementById('status').textContent = 'Thinking...';
+                });
+            } else {
+                setInterval(checkForNewAudio, 1000);
+                setInterval(updateConversation, 2000);
+            }
+            
+            // Play an answer while it is synthesized; the server streams its sentences in order
+            function playStream(responseId) {
+                const player = document.getElementById('audio-player');
+                player.src = '/audio-stream/' + responseId;
+                document.getElementById('status').textContent = 'Speaking...';
+                player.play().catch(e => console.error('Playback failed:', e));
+            }
             
             function checkForNewAudio() {
                 fetch('/audio-status')
                     .then(response => response.json())
                     .then(data => {
-                        if (data.available && data.timestamp > lastTimestamp) {
-                            lastTimestamp = data.timestamp;
-                            document.getElementById('status').textContent = 'New audio response available! Playing...';
-                            document.getElementById('audio-player').src = '/get-audio?t=' + new Date().getTime();
-                            document.getElementById('audio-player').play().catch(e => console.error('Playback failed:', e));
+                        if (data.speech && data.speech.response_id !== lastSpeechId) {
+                            lastSpeechId = data.speech.response_id;
+                            playStream(lastSpeechId);
+                        }
+                        if (data.available) {
+                            playAudio(data);
                         }
                     })
                     .catch(error => {
@@ -496,23 +1087,37 @@ def index():
                     });
             }
             
+            function playAudio(audio) {
+                if (audio.timestamp <= lastTimestamp) return;
+                lastTimestamp = audio.timestamp;
+                // An answer that was streamed has already been played
+                if (audio.audio_id === lastSpeechId) return;
+                document.getElementById('status').textContent = 'New audio response available! Playing...';
+                document.getElementById('audio-player').src = audio.audio_url
+                    ? audio.audio_url + '?format=' + audioFormat
+                    : '/get-audio?t=' + new Date().getTime();
+                document.getElementById('audio-player').play().catch(e => console.error('Playback failed:', e));
+            }
+            
             function updateConversation() {
                 fetch('/conversation')
                     .then(response => response.json())
-                    .then(data => {
-                        const conv = document.getElementById('conversation');
-                        conv.innerHTML = '';
-                        data.conversation.slice(-6).forEach(msg => {
-                            const div = document.createElement('div');
-                            div.className = 'message ' + msg.type;
-                            div.innerHTML = '<strong>' + (msg.type === 'user' ? 'You' : 'AI') + ':</strong> ' + msg.text;
-                            conv.appendChild(div);
-                        });
-                        conv.scrollTop = conv.scrollHeight;
-                    })
+                    .then(data => renderConversation(data.conversation))
                     .catch(error => console.error('Error updating conversation:', error));
             }
             
+            function renderConversation(conversation) {
+                const conv = document.getElementById('conversation');
+                conv.innerHTML = '';
+                conversation.slice(-6).forEach(msg => {
+                    const div = document.createElement('div');
+                    div.className = 'message ' + msg.type;
+                    div.innerHTML = '<strong>' + (msg.type === 'user' ? 'You' : 'AI') + ':</strong> ' + msg.text;
+                    conv.appendChild(div);
+                });
+                conv.scrollTop = conv.scrollHeight;
+            }
+            
             function toggleListening() {
                 // This would integrate with the voice system
                 fetch('/toggle-listening', {method: 'POST'})
@@ -530,24 +1135,138 @@ def index():
     </html>
     """
 
+def send_artifact(artifact, max_age):
+    """
+    Serve a response's audio with its ETag and Content-Length; send_file
+    answers If-None-Match with 304 and Range requests with 206.
+    The format is ?format= (wav, opus, mp3) or negotiated from Accept; a
+    compressed copy is encoded once per response and reused.
+    """
+    audio_format = negotiate_format(request.accept_mimetypes, delivery_formats,
+                                    requested=request.args.get("format"), default=AUDIO_DEFAULT_FORMAT)
+    audio = None
+    try:
+        audio = audio_artifacts.variant(artifact["id"], audio_format)
+    except Exception as e:
+        origin_logger.warning(f"Audio Artifacts: could not encode {artifact['id']} as {audio_format}, sending WAV: {e}")
+    if audio is None:
+        audio = audio_artifacts.variant(artifact["id"], "wav") or dict(artifact, mime="audio/wav")
+    
+    response = send_file(audio["path"], mimetype=audio["mime"], conditional=True,
+                         etag=audio["etag"], max_age=max_age)
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Vary"] = "Accept"
+    return response
+
 @app.route('/get-audio')
 def get_audio():
     try:
-        if os.path.exists("response.wav"):
-            return send_file("response.wav", mimetype='audio/wav')
+        artifact = audio_artifacts.latest()
+        if artifact:
+            return send_artifact(artifact, max_age=0)  # Changes with every answer; revalidate by ETag
         else:
             return jsonify({"error": "No audio available"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/get-audio/<response_id>')
+def get_response_audio(response_id):
+    """A single response's audio; it never changes, so clients may cache it"""
+    artifact = audio_artifacts.get(response_id)
+    if artifact is None:
+        return jsonify({"error": "Unknown or expired response"}), 404
+    return send_artifact(artifact, max_age=AUDIO_RETENTION)
+
+def get_speech_stream(response_id=None):
+    """A streamed answer by ID, or the desktop assistant's newest one"""
+    with speech_streams_lock:
+        return speech_streams.get(response_id or latest_speech["response_id"])
+
+@app.route('/audio-stream/<response_id>')
+def audio_stream(response_id):
+    """
+    An answer's speech as one WAV, sent in chunks as its sentences are
+    synthesized, in order. A player can start on the first sentence while
+    the rest are still being generated.
+    """
+    speech = get_speech_stream(response_id)
+    if speech is None:
+        return jsonify({"error": "Unknown response"}), 404
+    
+    def generate():
+        header_sent = False
+        index = 0
+        while True:
+            segment = speech.wait_for_segment(index)
+            if segment is None:
+                break
+            index += 1
+            if not segment["audio"]:
+                continue  # A failed sentence is skipped rather than ending the answer
+            header, frames = split_wav(segment["audio"])
+            if not header_sent:
+                yield streaming_wav_header(header)
+                header_sent = True
+            yield frames
+    
+    return Response(generate(), mimetype="audio/wav",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/audio-segments')
+def audio_segments():
+    """
+    Sentences of a streamed answer (the latest one unless ?response_id= is
+    given) and which of them are ready to play
+    """
+    speech = get_speech_stream(request.args.get("response_id"))
+    if speech is None:
+        return jsonify({"error": "No streamed answer"}), 404
+    return jsonify(speech.status())
+
+@app.route('/audio-segment/<response_id>/<int:index>')
+def audio_segment(response_id, index):
+    """
+    One sentence of a streamed answer as WAV. Waits for it to be synthesized;
+    404 once the answer has ended without that many sentences.
+    """
+    speech = get_speech_stream(response_id)
+    if speech is None:
+        return jsonify({"error": "Unknown response"}), 404
+    
+    segment = speech.wait_for_segment(index)
+    if segment is None:
+        return jsonify({"error": "No such segment"}), 404
+    if segment["audio"] is None:
+        return jsonify({"error": segment["error"]}), 502
+    return Response(segment["audio"], mimetype='audio/wav')
+
 @app.route('/audio-status')
 def audio_status():
     global latest_audio_timestamp
     
+    speech = get_speech_stream()
     return jsonify({
         "timestamp": latest_audio_timestamp,
-        "available": os.path.exists("response.wav") and time.time() - latest_audio_timestamp < 60,
-        "voice_status": voice_status
+        "available": audio_artifacts.get(latest_audio_id) is not None and time.time() - latest_audio_timestamp < 60,
+        "audio_id": latest_audio_id,
+        "audio_url": f"/get-audio/{latest_audio_id}" if latest_audio_id else None,
+        "voice_status": voice_status,
+        "streamed_response_id": latest_streamed_response["response_id"],
+        "speech": speech.status() if speech else None,
+        "pipeline": utterance_pipeline.metrics(),
+        "vad": mic_endpointer.stats,
+        "stt": stt_router.stats(),
+        "connections": provider_clients.stats(),
+        "breakers": {name: breaker.snapshot() for name, breaker in provider_breakers.items()},
+        "screen_cache": screen_cache.stats(),
+        "rate_limits": {name: limiter.stats() for name, limiter in groq_limiters.items()},
+        "capabilities": model_capabilities.stats(),
+        "answer_cache": dict(answer_cache.stats(), enabled=ANSWER_CACHE_ENABLED),
+        "tts_cache": tts_cache.stats() if tts_cache else {"enabled": False},
+        "audio_artifacts": dict(audio_artifacts.stats(), formats=delivery_formats, default_format=AUDIO_DEFAULT_FORMAT),
+        "events": events.stats(),
+        "screen_context": {"mode": SCREEN_CONTEXT, "modes": screen_context_stats.snapshot()},
+        "streams": dict(stream_sessions.stats(), pipeline=stream_pipeline.metrics())
     })
 
 @app.route('/conversation')
@@ -557,17 +1276,76 @@ def get_conversation():
         "voice_status": voice_status
     })
 
+@app.route('/events')
+def event_stream():
+    """
+    Server-sent events: "voice_status", "conversation", "speech" (a streamed
+    answer started) and "audio" (an answer's audio is ready). The current
+    status and conversation are sent first. /audio-status and /conversation
+    still work for clients that poll.
+
+    Without ?session=<id> these are the desktop assistant's events; with it,
+    only that stream (or /process-audio) session's.
+    """
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", ""))
+    except ValueError:
+        last_event_id = None
+    session = None
+    if request.args.get("session"):
+        session = stream_sessions.get(request.args["session"])
+        if session is None:
+            return jsonify({"error": "Unknown session"}), 404
+    
+    subscriber = events.subscribe(last_event_id, scope=event_scope(session))
+    if subscriber is None:
+        return jsonify({"error": "Too many event subscribers"}), 503
+    
+    with conversation_lock:
+        if session is None:
+            status, conversation = dict(voice_status), list(current_conversation)
+        else:
+            status, conversation = dict(session.voice_status), list(session.conversation)
+    initial = [("voice_status", status), ("conversation", {"conversation": conversation})]
+    return Response(events.stream(subscriber, initial), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route('/toggle-listening', methods=['POST'])
 def toggle_listening():
     global voice_status
     
     if voice_status["listening"]:
-        voice_status["listening"] = False
+        set_voice_status(listening=False)
         return jsonify({"status": "Stopped listening", "listening": False})
     else:
-        voice_status["listening"] = True
+        set_voice_status(listening=True)
         return jsonify({"status": "Started listening", "listening": True})
 
+@app.route('/capture-region', methods=['GET', 'POST'])
+def capture_region_endpoint():
+    """
+    Choose what the screenshots show. POST {"x", "y", "width", "height"} in
+    screen points (e.g. the learning iframe's bounding box), {"mode":
+    "active_window"} or {"mode": "full"}.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        mode = data.get("mode", "region")
+        if mode == "region":
+            try:
+                capture_region["region"] = parse_region(data)
+            except ValueError as e:
+                return jsonify({"error": f"Invalid region: {e}"}), 400
+        elif mode not in ("full", "active_window"):
+            return jsonify({"error": "mode must be region, active_window or full"}), 400
+        capture_region["mode"] = mode
+        origin_logger.info(f"Screenshot: capture mode {mode} {capture_region['region'] if mode == 'region' else ''}")
+    
+    return jsonify({
+        "mode": capture_region["mode"],
+        "region": capture_region["region"] if capture_region["mode"] == "region" else None
+    })
+
 @app.route('/process-audio', methods=['POST'])
 def process_audio_endpoint():
     """
@@ -581,19 +1359,39 @@ def process_audio_endpoint():
         if audio_file.filename == '':
             return jsonify({"error": "No audio file selected"}), 400
         
-        # Save uploaded audio
-        audio_path = "uploaded_audio.wav"
-        audio_file.save(audio_path)
+        # Optional screen region for this question, as JSON {"x", "y", "width", "height"}
+        region = None
+        if request.form.get('region'):
+            try:
+                region = parse_region(json.loads(request.form['region']))
+            except ValueError as e:
+                return jsonify({"error": f"Invalid region: {e}"}), 400
+        
+        # Optional session, so a remote browser's uploads keep their own history, like a /stream session
+        session = None
+        if request.form.get('session_id'):
+            session = stream_sessions.get_or_create(request.form['session_id'])
+            if session is None:
+                return jsonify({"error": "Too many active streaming sessions"}), 503
         
-        # Process the audio
-        result = process_voice_input(audio_path)
+        # Keep the upload in memory so concurrent requests don't share a file
+        uploaded_audio = BytesIO(audio_file.read())
+        uploaded_audio.name = audio_file.filename
+        if DEBUG_SAVE_AUDIO:
+            save_debug_audio(uploaded_audio, DEBUG_AUDIO_DIR)
+        
+        # Process the audio; cache=0 always asks the LLM
+        result = process_voice_input(uploaded_audio, region, use_cache=request.form.get('cache') != '0', session=session)
         
         if result:
             return jsonify({
                 "success": True,
                 "transcription": result["transcription"],
                 "response": result["response"],
-                "audio_available": os.path.exists("response.wav")
+                "response_id": result["response_id"],
+                "audio_available": audio_artifacts.get(result["response_id"]) is not None,
+                "audio_url": f"/get-audio/{result['response_id']}",
+                "stream_url": f"/audio-stream/{result['response_id']}"
             })
         else:
             return jsonify({"error": "Failed to process audio"}), 500
@@ -601,21 +1399,105 @@ def process_audio_endpoint():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/batch-transcribe', methods=['POST'])
+def batch_transcribe_endpoint():
+    """
+    Transcribe many uploaded recordings (repeat the `audio` field) without
+    running the LLM or TTS. Results stream back as JSON lines, one per
+    recording, in the order they finish.
+    """
+    uploads = []
+    for audio_file in request.files.getlist('audio'):
+        if audio_file.filename == '':
+            continue
+        audio = BytesIO(audio_file.read())
+        audio.name = audio_file.filename
+        uploads.append((audio_file.filename, audio))
+    
+    if not uploads:
+        return jsonify({"error": "No audio files provided"}), 400
+    
+    origin_logger.info(f"Batch: transcribing {len(uploads)} recordings")
+    
+    def generate():
+        for result in transcribe_batch(uploads, batch_providers, max_workers=BATCH_WORKERS):
+            yield json.dumps(result) + "\n"
+    
+    return Response(generate(), mimetype="application/x-ndjson")
+
+def on_mic_utterance(pcm):
+    """Capture loop callback: queue the utterance together with its screenshot"""
+    utterance_pipeline.submit(pcm, context=prefetch_screenshot())
+
+@app.route('/stream/<session_id>', methods=['POST'])
+def stream_audio(session_id):
+    """
+    Ingest raw 16 kHz, 16-bit mono little-endian PCM from a browser.
+
+    The body may be a long-lived chunked upload or a short batch of frames
+    posted every few hundred milliseconds; it is endpointed as it is read,
+    and finished utterances are queued for processing. Pass ?final=1 to end
+    the current utterance immediately (e.g. when the user releases the mic).
+    """
+    session = stream_sessions.get_or_create(session_id)
+    if session is None:
+        return jsonify({"error": "Too many active streaming sessions"}), 503
+    
+    try:
+        queued = 0
+        while True:
+            data = request.stream.read(STREAM_READ_SIZE)
+            if not data:
+                break
+            for pcm in session.feed(data):
+                stream_pipeline.submit(pcm, session)
+                queued += 1
+        
+        if request.args.get("final") in ("1", "true"):
+            pcm = session.flush()
+            if pcm is not None:
+                stream_pipeline.submit(pcm, session)
+                queued += 1
+        
+        return jsonify({"success": True, "queued": queued, "session": session.status()})
+    except Exception as e:
+        origin_logger.error(f"Stream Error: session {session_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stream/<session_id>/results')
+def stream_results(session_id):
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+    
+    with conversation_lock:
+        conversation = list(session.conversation)
+    return jsonify({
+        "session": session.status(),
+        "results": list(session.results),
+        "conversation": conversation
+    })
+
+@app.route('/stream/<session_id>', methods=['DELETE'])
+def close_stream(session_id):
+    session = stream_sessions.close(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown session"}), 404
+    
+    pcm = session.flush()
+    if pcm is not None:
+        stream_pipeline.submit(pcm, session)
+    return jsonify({"success": True, "session": session.status()})
+
 if __name__ == "__main__":
     # Define the voice assistant function to run in a separate thread
     def run_voice_assistant():
         global latest_audio_timestamp, voice_status
         
-        # Initialize PyAudio
-        audio = pyaudio.PyAudio()
-        
-        # Initialize WebRTC VAD
-        vad = webrtcvad.Vad()
-        vad.set_mode(3)  # Aggressive mode for better voice detection
-        
         # Open audio stream to get audio from microphone
-        stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE,
-                           input=True, frames_per_buffer=CHUNK_SIZE)
+        source = MicrophoneSource(rate=RATE, channels=CHANNELS, frames_per_buffer=CHUNK_SIZE)
+        
+        utterance_pipeline.start()
         
         print("🎓 AI Learning Assistant is listening...")
         print("📱 Web interface available at http://localhost:5000")
@@ -624,39 +1506,12 @@ if __name__ == "__main__":
         print()
         
         try:
-            accumulated_data = b""
-            accumulated_silence = 0
-            while True:
-                if not voice_status["listening"]:
-                    time.sleep(0.1)
-                    continue
-                    
-                chunk = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                is_silent = is_silence(chunk)
-                
-                if is_silent:
-                    accumulated_silence += CHUNK_DURATION_MS
-                    if accumulated_silence >= TARGET_DURATION_MS:
-                        if accumulated_data != b"":
-                            # Convert raw audio to WAV format
-                            audio_segment = AudioSegment(
-                                data=accumulated_data,
-                                sample_width=2,  # 16-bit audio
-                                frame_rate=16000,
-                                channels=1
-                            )
-                            # Export to WAV format
-                            audio_segment.export('captured_audio.wav', format='wav')
-                            
-                            # Process the captured audio
-                            result = process_voice_input('captured_audio.wav')
-                            
-                            accumulated_data = b""
-                        accumulated_silence = 0
-                else:
-                    accumulated_data += chunk
-                    accumulated_silence = 0
-                    
+            run_capture_loop(
+                source,
+                mic_endpointer,
+                on_mic_utterance,
+                should_listen=lambda: voice_status["listening"]
+            )
         except KeyboardInterrupt:
             pass
         except Exception as e:
@@ -664,9 +1519,8 @@ if __name__ == "__main__":
             origin_logger.error(f"Voice Assistant Error: {e}")
         finally:
             print("Stopping voice assistant...")
-            stream.stop_stream()
-            stream.close()
-            audio.terminate()
+            utterance_pipeline.stop(timeout=1)
+            source.close()
     
     # Start Flask in a separate thread
     def run_flask():
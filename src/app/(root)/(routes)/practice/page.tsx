@@ -146,6 +146,9 @@ const PracticePage = () => {
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
   const audioChunksRef = useRef<Blob[]>([]);
   const lastAudioTimestamp = useRef<number>(0);
+  const latestAudioUrl = useRef<string | null>(null);
+  const streamedResponseId = useRef<string | null>(null);
+  const learningFrameRef = useRef<HTMLDivElement | null>(null);
 
   // Educational videos database
   const educationalVideos = [
@@ -224,6 +227,38 @@ const PracticePage = () => {
     }
   };
 
+  // Apply backend updates, whether pushed over /events or polled
+  const applyVoiceStatus = (status: any) => {
+    setIsListening(status?.listening || false);
+    setIsProcessing(status?.processing || false);
+    setIsSpeaking(status?.speaking || false);
+  };
+
+  const applyNewAudio = (audio: any) => {
+    if (audio.timestamp > lastAudioTimestamp.current) {
+      lastAudioTimestamp.current = audio.timestamp;
+      // Already playing from /audio-stream since the answer started
+      if (audio.audio_id && audio.audio_id === streamedResponseId.current) return;
+      latestAudioUrl.current = audio.audio_url || null;
+      playAudioResponse();
+    }
+  };
+
+  // An answer started speaking: play its chunked stream rather than waiting for the whole file
+  const applySpeech = (speech: any) => {
+    streamedResponseId.current = speech.response_id;
+    latestAudioUrl.current = `/audio-stream/${speech.response_id}`;
+    playAudioResponse();
+  };
+
+  const applyConversation = (messages: any[]) => {
+    setConversation(messages.map((msg: any) => ({
+      type: msg.type,
+      text: msg.text,
+      timestamp: msg.timestamp
+    })));
+  };
+
   // Poll for new audio and conversation updates (updated to port 8000)
   const pollBackend = async () => {
     if (voiceBackendStatus !== 'connected') return;
@@ -234,14 +269,11 @@ const PracticePage = () => {
       const audioData = await audioResponse.json();
       
       // Update voice status
-      setIsListening(audioData.voice_status?.listening || false);
-      setIsProcessing(audioData.voice_status?.processing || false);
-      setIsSpeaking(audioData.voice_status?.speaking || false);
+      applyVoiceStatus(audioData.voice_status);
       
       // Play new audio if available
-      if (audioData.available && audioData.timestamp > lastAudioTimestamp.current) {
-        lastAudioTimestamp.current = audioData.timestamp;
-        playAudioResponse();
+      if (audioData.available) {
+        applyNewAudio(audioData);
       }
 
       // Update conversation
@@ -249,11 +281,7 @@ const PracticePage = () => {
       const conversationData = await conversationResponse.json();
       
       if (conversationData.conversation) {
-        setConversation(conversationData.conversation.map((msg: any) => ({
-          type: msg.type,
-          text: msg.text,
-          timestamp: msg.timestamp
-        })));
+        applyConversation(conversationData.conversation);
       }
     } catch (error) {
       console.error('Error polling backend:', error);
@@ -264,11 +292,18 @@ const PracticePage = () => {
   const playAudioResponse = async () => {
     try {
       console.log('Attempting to play audio response...');
-      const audioUrl = `http://localhost:8000/get-audio?t=${Date.now()}`;
+      // Each response has its own URL, so the browser can cache it; older servers only have /get-audio.
+      // Finished answers are fetched compressed (the server sends WAV if it can't encode); streams are WAV
+      const audioFormat = new Audio().canPlayType('audio/ogg; codecs=opus') ? 'opus' : 'mp3';
+      const audioUrl = !latestAudioUrl.current
+        ? `http://localhost:8000/get-audio?t=${Date.now()}`
+        : latestAudioUrl.current.startsWith('/audio-stream/')
+          ? `http://localhost:8000${latestAudioUrl.current}`
+          : `http://localhost:8000${latestAudioUrl.current}?format=${audioFormat}`;
       
-      // Check if audio file is available first
-      const response = await fetch(audioUrl);
-      if (!response.ok) {
+      // Check if audio file is available first (a stream is checked by playing it)
+      const response = audioUrl.includes('/audio-stream/') ? null : await fetch(audioUrl);
+      if (response && !response.ok) {
         console.error('Audio file not available:', response.status);
         return;
       }
@@ -447,6 +482,45 @@ const PracticePage = () => {
     }
   };
 
+  // Tell the AI backend where the learning iframe is, so screenshots only capture it
+  const updateCaptureRegion = async () => {
+    if (voiceBackendStatus !== 'connected') return;
+    
+    // Tabs without an iframe (e.g. notes) fall back to the full screen
+    const frame = learningFrameRef.current;
+    let region: object = { mode: 'full' };
+    if (frame) {
+      // Convert the iframe's viewport position to screen coordinates (browser chrome sits above the viewport)
+      const rect = frame.getBoundingClientRect();
+      const chromeX = (window.outerWidth - window.innerWidth) / 2;
+      const chromeY = window.outerHeight - window.innerHeight - chromeX;
+      region = {
+        x: window.screenX + chromeX + rect.left,
+        y: window.screenY + chromeY + rect.top,
+        width: rect.width,
+        height: rect.height
+      };
+    }
+    
+    try {
+      await fetch('http://localhost:8000/capture-region', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(region),
+      });
+    } catch (error) {
+      console.error('Error updating capture region:', error);
+    }
+  };
+
+  useEffect(() => {
+    updateCaptureRegion();
+    window.addEventListener('resize', updateCaptureRegion);
+    return () => window.removeEventListener('resize', updateCaptureRegion);
+  }, [selectedTab, isFullscreen, voiceBackendStatus]);
+
   // Filter videos based on search and category
   useEffect(() => {
     let filtered = educationalVideos;
@@ -476,11 +550,24 @@ const PracticePage = () => {
       updateVideoContext(currentVideoId);
     }, 2000);
     
-    const pollInterval = setInterval(pollBackend, 1000);
+    // Updates are pushed over server-sent events; browsers without EventSource poll instead
+    let pollInterval: ReturnType<typeof setInterval> | null = null;
+    let events: EventSource | null = null;
+    if (typeof EventSource !== 'undefined') {
+      events = new EventSource('http://localhost:8000/events');
+      events.onopen = () => setVoiceBackendStatus('connected');
+      events.addEventListener('voice_status', (e) => applyVoiceStatus(JSON.parse((e as MessageEvent).data)));
+      events.addEventListener('speech', (e) => applySpeech(JSON.parse((e as MessageEvent).data)));
+      events.addEventListener('audio', (e) => applyNewAudio(JSON.parse((e as MessageEvent).data)));
+      events.addEventListener('conversation', (e) => applyConversation(JSON.parse((e as MessageEvent).data).conversation));
+    } else {
+      pollInterval = setInterval(pollBackend, 1000);
+    }
     const statusInterval = setInterval(checkVoiceBackend, 5000);
     
     return () => {
-      clearInterval(pollInterval);
+      events?.close();
+      if (pollInterval) clearInterval(pollInterval);
       clearInterval(statusInterval);
     };
   }, []); // Remove voiceBackendStatus dependency to prevent infinite loop
@@ -565,7 +652,7 @@ const PracticePage = () => {
             <div className="flex-1 flex min-h-0">
               {/* Video Player */}
               <div className="flex-1 bg-black flex flex-col">
-                <div className="flex-1">
+                <div className="flex-1" ref={learningFrameRef}>
                   <iframe
                     src={`https://www.youtube.com/embed/${currentVideoId}?enablejsapi=1&origin=${typeof window !== 'undefined' ? window.location.origin : ''}`}
                     className="w-full h-full border-0"
@@ -617,7 +704,7 @@ const PracticePage = () => {
         
       case 'excalidraw':
         return (
-          <div className="w-full h-full bg-white">
+          <div className="w-full h-full bg-white" ref={learningFrameRef}>
             <iframe
               src="https://excalidraw.com"
               className="w-full h-full border-0"